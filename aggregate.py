@@ -0,0 +1,299 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module merges the JUnit reports in the reports directories of the test suites
+of a project into one compact JUnit report and a summary, so that Jenkins publishes
+a single small file rather than thousands of large ones.  The reports are parsed
+on a pool of worker processes.  The pipeline generated with --aggregate-reports
+runs it in the workspace after the tests:
+
+    python aggregate.py cfg/project.xml
+
+Each shard of a sharded project merges only the reports of its own suites, named
+in the list written next to the batch file of the shard:
+
+    python aggregate.py --suites rungfit-shard1.suites cfg/project.xml
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+import discovery
+import reports
+from filecreator import FileCreator
+from filecreator import read_suites_file
+from filecreator import write_atomic
+from generatepipeline import merged_report_name
+from projectconfig import ProjectConfig
+from projectconfigexception import ProjectConfigException
+
+# Name of the summary written next to the merged report
+summary_name = "gfit-summary.json"
+
+# Name of the total of each outcome other than passed
+outcome_totals = {"failure": "failures", "error": "errors", "skipped": "skipped"}
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class ReportAggregator:
+    """
+    This class merges the reports of the test suites of a project.  Each suite
+    becomes one testsuite element of the merged report, holding its test cases
+    without their output.  The totals of each suite are kept for the summary.
+    """
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, project_config, workers=None, test_suites=None):
+        """Initialize the class.
+
+        Arguments:
+            project_config - a configuration with a single combination
+            workers - the number of worker processes that parse reports.  None
+                means one per CPU.
+            test_suites - the names of the test suites whose reports are merged,
+                or None for all the test suites of the project
+        """
+        assert project_config is not None, "Project config instance must not be null"
+        assert workers is None or workers > 0, "Number of workers must be positive"
+        self._project_config = project_config
+        self._workers = workers if workers is not None else (os.cpu_count() or 1)
+        self._test_suites = test_suites
+        self._suites = {}
+        self._unreadable = 0
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def summary(self):
+        """Return the summary of the merged reports as a dictionary"""
+        totals = {"tests": 0, "failures": 0, "errors": 0, "skipped": 0, "time": 0.0}
+        for counts in self._suites.values():
+            for name in totals:
+                totals[name] += counts[name]
+        totals["time"] = round(totals["time"], 3)
+        totals["passed"] = totals["tests"] - totals["failures"] - totals["errors"] - totals["skipped"]
+        totals["unreadable_reports"] = self._unreadable
+        totals["suites"] = self._suites
+        return totals
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def aggregate(self, output, summary_file):
+        """
+        Write the merged report and the summary.  Suites without reports are left
+        out.
+
+        Arguments:
+            output - the name of the merged report file
+            summary_file - the name of the summary file
+        """
+        write_atomic(output, self.iter_merged())
+        write_atomic(summary_file, [json.dumps(self.summary, indent=1, sort_keys=True)])
+        return
+
+    def iter_merged(self):
+        """Return an iterator over the pieces of the merged report.  The reports are
+        parsed in order on the worker processes, and each suite is written as soon
+        as all of its reports have been read."""
+        creator = FileCreator(self._project_config)
+        test_suites = self._test_suites if self._test_suites is not None else creator.test_suites
+        report_files = []
+        for test_suite in test_suites:
+            for report_file in reports.find_report_files(creator.reports_dir(test_suite)):
+                report_files.append((test_suite, report_file))
+        self._suites = {}
+        self._unreadable = 0
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n'
+        current = None
+        cases = []
+        for (test_suite, report_file), report_cases in zip(report_files, self.read_all(report_files)):
+            if test_suite != current:
+                if current is not None:
+                    yield self.suite_element(current, cases)
+                current = test_suite
+                cases = []
+            if report_cases is None:
+                self._unreadable += 1
+                continue
+            cases.extend(report_cases)
+        if current is not None:
+            yield self.suite_element(current, cases)
+        yield "</testsuites>\n"
+
+    def read_all(self, report_files):
+        """
+        Return an iterator over the lists of test cases of the report files, in
+        order, read on the worker processes.
+
+        Argument:
+            report_files - the list of test suite and report file pairs
+        """
+        filenames = [report_file for _, report_file in report_files]
+        if self._workers <= 1 or len(filenames) <= 1:
+            yield from map(reports.read_report_cases, filenames)
+            return
+        chunk_size = max(1, len(filenames) // (self._workers * 4))
+        with ProcessPoolExecutor(max_workers=min(self._workers, len(filenames))) as executor:
+            yield from executor.map(reports.read_report_cases, filenames, chunksize=chunk_size)
+
+    def suite_element(self, test_suite, cases):
+        """
+        Return the testsuite element of a test suite and record its totals.
+
+        Arguments:
+            test_suite - the name of the test suite
+            cases - the list of ReportCase of the suite
+        """
+        counts = {"tests": len(cases), "failures": 0, "errors": 0, "skipped": 0, "time": 0.0}
+        for case in cases:
+            if case.outcome in outcome_totals:
+                counts[outcome_totals[case.outcome]] += 1
+            counts["time"] += case.time
+        counts["time"] = round(counts["time"], 3)
+        self._suites[test_suite] = counts
+        parts = ["  <testsuite name=" + quoteattr(test_suite) +
+                 " tests=\"" + str(counts["tests"]) + "\" failures=\"" + str(counts["failures"]) +
+                 "\" errors=\"" + str(counts["errors"]) + "\" skipped=\"" + str(counts["skipped"]) +
+                 "\" time=\"" + str(counts["time"]) + "\">\n"]
+        for case in cases:
+            classname = case.classname if len(case.classname) > 0 else test_suite
+            element = "    <testcase classname=" + quoteattr(classname) + " name=" + quoteattr(case.name) + \
+                " time=\"" + str(case.time) + "\""
+            if case.outcome == "passed":
+                parts.append(element + "/>\n")
+                continue
+            parts.append(element + ">\n      <" + case.outcome + " message=" + quoteattr(case.message) + ">" +
+                         escape(case.detail) + "</" + case.outcome + ">\n    </testcase>\n")
+        parts.append("  </testsuite>\n")
+        return "".join(parts)
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def pipeline_command(project_config):
+    """
+    Return the command that the pipeline runs in the workspace to merge the reports
+    of a combination of a project.
+
+    Argument:
+        project_config - a configuration with a single combination
+    """
+    return "python " + os.path.abspath(__file__) + " --environment " + project_config.environment + \
+        " --product " + project_config.product + " " + os.path.abspath(project_config.filename)
+
+
+def select_combination(project_config, environment=None, product=None):
+    """
+    Return the configuration of the combination with an environment and product,
+    or the single combination of a configuration without a matrix.
+
+    Arguments:
+        project_config - the parsed project configuration
+        environment - the name of the environment, or None
+        product - the product abbreviation, or None
+    """
+    combinations = project_config.expand()
+    matches = [combination for combination in combinations
+               if (environment is None or combination.environment == environment) and
+               (product is None or combination.product == product)]
+    if len(matches) == 0:
+        message = "The configuration has no combination for " + str(environment) + " " + str(product)
+        raise ProjectConfigException(message)
+    if len(matches) > 1:
+        raise ProjectConfigException("The configuration has several combinations; give the environment and product")
+    return matches[0]
+
+
+def parse_arguments(argv):
+    """
+    Return the parsed command line arguments.
+
+    Arguments:
+        argv - the command line arguments without the program name
+    """
+    parser = argparse.ArgumentParser(prog="aggregate.py",
+                                     description="Merge the JUnit reports of the test suites of a project.")
+    parser.add_argument("config", metavar="project_config", help="the project config file")
+    parser.add_argument("--environment", default=None, help="the environment of a matrix configuration")
+    parser.add_argument("--product", default=None, help="the product of a matrix configuration")
+    parser.add_argument("--output", default=merged_report_name,
+                        help="the merged report to write (default: %(default)s)")
+    parser.add_argument("--summary", default=summary_name,
+                        help="the summary to write (default: %(default)s)")
+    parser.add_argument("--suites", default=None,
+                        help="a file listing the test suites to merge, one per line (default: all suites)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes that parse reports (default: one per CPU)")
+    return parser.parse_args(argv)
+
+
+def run(arguments):
+    """
+    Merge the reports named by the arguments and return the exit status.
+
+    Argument:
+        arguments - the parsed command line arguments
+    """
+    try:
+        project_config = ProjectConfig(arguments.config)
+        project_config.parse()
+        project_config = select_combination(project_config, arguments.environment, arguments.product)
+        test_suites = None
+        if arguments.suites is not None:
+            test_suites = read_suites_file(arguments.suites)
+        elif project_config.discovery is not None:
+            discovery.discover(project_config)
+        aggregator = ReportAggregator(project_config, arguments.workers, test_suites)
+        aggregator.aggregate(arguments.output, arguments.summary)
+    except ProjectConfigException as e:
+        print("Error: " + str(e))
+        return 1
+    summary = aggregator.summary
+    print("Suites: " + str(len(summary["suites"])) + ", tests: " + str(summary["tests"]) +
+          ", passed: " + str(summary["passed"]) + ", failures: " + str(summary["failures"]) +
+          ", errors: " + str(summary["errors"]) + ", skipped: " + str(summary["skipped"]) +
+          ", time: " + str(summary["time"]) + "s")
+    if summary["unreadable_reports"] > 0:
+        print("Unreadable reports: " + str(summary["unreadable_reports"]))
+    return 0
+
+
+if __name__ == '__main__':
+    """Merge the reports of a project"""
+    sys.exit(run(parse_arguments(sys.argv[1:])))
@@ -0,0 +1,306 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module benchmarks the Project Configuration tool.  It generates a synthetic
+project config file and a matching exec, workspace and TESTSUITES tree in a
+temporary directory, times each phase of the tool separately at several scales,
+and compares the results with a saved baseline.
+
+    python benchmark.py --scales 10,1000,100000 --output results.json
+    python benchmark.py --baseline results.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from xml.sax.saxutils import escape
+import main
+from dircache import DirectoryCache
+from filecreator import BatFileCreator
+from filecreator import PropertyCreator
+from generatepipeline import PipelineGenerator
+from projectconfig import ProjectConfig
+
+default_scales = [10, 100, 1000, 10000]
+
+# Names used in the synthetic configuration
+environment = "DEV"
+product = "PC"
+project = "BENCH"
+
+# -------------------------------------------------------------------------------
+#  Synthetic configuration
+# -------------------------------------------------------------------------------
+
+
+def create_tree(base_dir, suite_count):
+    """
+    Create a project config file and the directories it refers to.  The paths in
+    the configuration are relative to base_dir, which must be the current directory
+    while the benchmark runs.
+
+    Arguments:
+        base_dir - the directory that receives the tree
+        suite_count - the number of test suites
+
+    Returns:
+        The name of the project config file.
+    """
+    root = "exec"
+    workspace = "workspace"
+    for dir_name in [root + "/EXEC",
+                     root + "/" + environment + "/" + product + "/" + project,
+                     workspace + "/" + environment + "/" + project,
+                     root + "/TESTSUITES/" + product + "/" + project]:
+        os.makedirs(os.path.join(base_dir, dir_name), exist_ok=True)
+    if os.sep != "\\":
+        # The tool writes Windows paths.  Elsewhere they are single file names,
+        # so the project directory is also created under its Windows name.
+        windows_name = "\\".join([root, environment, product, project])
+        os.makedirs(os.path.join(base_dir, windows_name), exist_ok=True)
+    suite_root = os.path.join(base_dir, root, "TESTSUITES", product, project)
+    for index in range(suite_count):
+        os.mkdir(os.path.join(suite_root, suite_name(index)))
+    filename = os.path.join(base_dir, "config.xml")
+    with open(filename, mode="w") as file:
+        file.write("<TestConfiguration>\n")
+        for tag, text in [("Root", root), ("Workspace", workspace), ("Project", project),
+                          ("Environment", environment), ("Product", product),
+                          ("Server", "benchserver")]:
+            file.write("    <" + tag + ">" + escape(text) + "</" + tag + ">\n")
+        file.write("    <TestSuites>\n")
+        for index in range(suite_count):
+            file.write("        <TestSuite>" + suite_name(index) + "</TestSuite>\n")
+        file.write("    </TestSuites>\n")
+        file.write("</TestConfiguration>\n")
+    return filename
+
+
+def suite_name(index):
+    """Return the name of a synthetic test suite"""
+    return "Suite" + str(index).zfill(6)
+
+
+# -------------------------------------------------------------------------------
+#  Timing
+# -------------------------------------------------------------------------------
+
+
+def time_phase(function, repeat):
+    """
+    Return the shortest time in seconds of several calls to a function.  Console
+    output of the function is discarded.
+
+    Arguments:
+        function - a function without arguments
+        repeat - the number of calls
+    """
+    best = None
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def benchmark_scale(suite_count, repeat):
+    """
+    Return a dictionary of phase name to time in seconds for one scale.
+
+    Arguments:
+        suite_count - the number of test suites
+        repeat - the number of times each phase is run
+    """
+    base_dir = tempfile.mkdtemp(prefix="projectconfig-bench-")
+    current_dir = os.getcwd()
+    try:
+        filename = create_tree(base_dir, suite_count)
+        os.chdir(base_dir)
+        pcf = parse(filename)
+        suites = pcf.test_suites
+        workspace_path = None
+        run_file = None
+        with redirect_stdout(io.StringIO()):
+            workspace_path = main.validate_workspace(pcf.workspace, pcf.environment, pcf.project)
+            run_file = main.validate_exec_dir(pcf.root, pcf.environment, pcf.product, pcf.project)
+        phases = [
+            ("parse", lambda: parse(filename)),
+            ("parse_streaming", lambda: parse_streaming(filename)),
+            ("validate_root", lambda: main.validate_root(pcf.root, DirectoryCache())),
+            ("validate_workspace", lambda: main.validate_workspace(
+                pcf.workspace, pcf.environment, pcf.project, DirectoryCache())),
+            ("validate_exec_dir", lambda: main.validate_exec_dir(
+                pcf.root, pcf.environment, pcf.product, pcf.project, DirectoryCache())),
+            ("validate_test_suites", lambda: main.validate_test_suites(
+                pcf.root, pcf.product, pcf.test_suite_directory, suites, DirectoryCache())),
+            ("validate_test_suites_stat", lambda: main.validate_test_suites(
+                pcf.root, pcf.product, pcf.test_suite_directory, suites)),
+            ("bat_file_creator", lambda: BatFileCreator(pcf).create_rungfit()),
+            ("property_creator", lambda: PropertyCreator(pcf).create_properties_files()),
+            ("pipeline_generator", lambda: PipelineGenerator(pcf).output_pipeline(
+                workspace_path, run_file, stream=io.StringIO()))
+        ]
+        results = {}
+        for name, function in phases:
+            results[name] = time_phase(function, repeat)
+    finally:
+        os.chdir(current_dir)
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return results
+
+
+def parse(filename):
+    """Return a parsed configuration with its test suites read"""
+    pcf = ProjectConfig(filename)
+    pcf.parse()
+    len(pcf.test_suites)
+    return pcf
+
+
+def parse_streaming(filename):
+    """Parse a configuration in streaming mode and read its test suites"""
+    pcf = ProjectConfig(filename, streaming=True)
+    pcf.parse()
+    for _ in pcf.test_suites:
+        pass
+    return
+
+
+def run_benchmarks(scales, repeat):
+    """
+    Return the benchmark results for every scale as a dictionary that can be saved
+    as JSON.
+
+    Arguments:
+        scales - the numbers of test suites to be benchmarked
+        repeat - the number of times each phase is run
+    """
+    results = {}
+    for suite_count in scales:
+        print("Benchmarking " + str(suite_count) + " test suites", file=sys.stderr)
+        results[str(suite_count)] = benchmark_scale(suite_count, repeat)
+    return {
+        "version": 1,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results
+    }
+
+
+# -------------------------------------------------------------------------------
+#  Comparison
+# -------------------------------------------------------------------------------
+
+
+def compare(current, baseline, tolerance, noise):
+    """
+    Print each phase of the current results beside the baseline and return the list
+    of regressions.  A phase has regressed if it is slower than the baseline by more
+    than the tolerance and by more than the noise floor.
+
+    Arguments:
+        current - the current results
+        baseline - the saved baseline results
+        tolerance - the allowed slowdown as a fraction, for example 0.25
+        noise - the smallest slowdown in seconds that counts
+    """
+    regressions = []
+    print("{0:>8} {1:<28} {2:>12} {3:>12} {4:>8}".format("suites", "phase", "baseline", "current", "ratio"))
+    for scale, phases in current["results"].items():
+        base_phases = baseline["results"].get(scale, {})
+        for phase, seconds in phases.items():
+            if phase not in base_phases:
+                continue
+            base = base_phases[phase]
+            ratio = seconds / base if base > 0 else 1.0
+            flag = ""
+            if seconds > base * (1.0 + tolerance) and seconds - base > noise:
+                flag = "  REGRESSION"
+                regressions.append((scale, phase, base, seconds))
+            print("{0:>8} {1:<28} {2:>12.6f} {3:>12.6f} {4:>8.2f}{5}".format(
+                scale, phase, base, seconds, ratio, flag))
+    return regressions
+
+
+def print_results(current):
+    """Print the results of a benchmark run"""
+    print("{0:>8} {1:<28} {2:>12}".format("suites", "phase", "seconds"))
+    for scale, phases in current["results"].items():
+        for phase, seconds in phases.items():
+            print("{0:>8} {1:<28} {2:>12.6f}".format(scale, phase, seconds))
+    return
+
+
+# -------------------------------------------------------------------------------
+#  Main
+# -------------------------------------------------------------------------------
+
+
+def parse_arguments(argv):
+    """
+    Return the parsed command line arguments.
+
+    Arguments:
+        argv - the command line arguments without the program name
+    """
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Benchmark the ProjectConfig tool.")
+    parser.add_argument("--scales", default=",".join(str(scale) for scale in default_scales),
+                        help="comma separated numbers of test suites (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of each phase; the fastest is kept (default: %(default)s)")
+    parser.add_argument("--output", default=None, help="file that receives the results as JSON")
+    parser.add_argument("--baseline", default=None, help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown against the baseline as a fraction (default: %(default)s)")
+    parser.add_argument("--noise", type=float, default=0.001,
+                        help="smallest slowdown in seconds that counts (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    """Run the benchmarks"""
+    arguments = parse_arguments(sys.argv[1:])
+    scale_list = [int(scale) for scale in arguments.scales.split(",") if len(scale.strip()) > 0]
+    outcome = run_benchmarks(scale_list, arguments.repeat)
+    if arguments.output is not None:
+        with open(arguments.output, mode="w") as output:
+            json.dump(outcome, output, indent=2)
+    if arguments.baseline is None:
+        print_results(outcome)
+        sys.exit(0)
+    with open(arguments.baseline, mode="r") as saved:
+        saved_outcome = json.load(saved)
+    found = compare(outcome, saved_outcome, arguments.tolerance, arguments.noise)
+    if len(found) > 0:
+        print(str(len(found)) + " phases regressed")
+        sys.exit(1)
+    sys.exit(0)
@@ -0,0 +1,144 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module is the client of the Project Configuration server.  It sends a request
+to regenerate a project and prints the output of the server.  It imports nothing
+from the tool itself, so it starts quickly.
+
+    python client.py cfg/project.xml
+    python client.py --socket /tmp/projectconfig.sock cfg/project.xml
+    python client.py --command shutdown
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+# Address the server listens on by default
+default_host = "127.0.0.1"
+default_port = 47800
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def connect(host=default_host, port=default_port, socket_path=None, timeout=None):
+    """
+    Return a socket connected to the server.
+
+    Arguments:
+        host - the host name of a TCP server
+        port - the port of a TCP server
+        socket_path - the path of a Unix domain socket, which is used instead of
+            the host and port if given
+        timeout - the time in seconds to wait for a reply, or None to wait forever
+    """
+    if socket_path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(socket_path)
+        return connection
+    connection = socket.create_connection((host, port))
+    connection.settimeout(timeout)
+    return connection
+
+
+def send_request(connection, request):
+    """
+    Send a request to the server and return its response.  Each request and each
+    response is one line of JSON.
+
+    Arguments:
+        connection - a connected socket
+        request - the request as a dictionary
+    """
+    connection.sendall((json.dumps(request) + "\n").encode("utf-8"))
+    with connection.makefile(mode="r", encoding="utf-8") as reader:
+        line = reader.readline()
+    if len(line) == 0:
+        return {"succeeded": False, "message": "Error: The server closed the connection", "output": ""}
+    return json.loads(line)
+
+
+def parse_arguments(argv):
+    """
+    Return the parsed command line arguments.
+
+    Arguments:
+        argv - the command line arguments without the program name
+    """
+    parser = argparse.ArgumentParser(prog="client.py", description="Send a request to the ProjectConfig server.")
+    parser.add_argument("configs", nargs="*", metavar="project_config", help="project config files to regenerate")
+    parser.add_argument("--command", default="generate", choices=["generate", "ping", "stats", "shutdown"],
+                        help="the request to send (default: %(default)s)")
+    parser.add_argument("--host", default=default_host, help="host of the server (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=default_port, help="port of the server (default: %(default)s)")
+    parser.add_argument("--socket", default=None, dest="socket_path",
+                        help="Unix domain socket of the server, used instead of the host and port")
+    parser.add_argument("--streaming", action="store_true", help="stream the test suites from the XML file")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds to wait for the server")
+    return parser.parse_args(argv)
+
+
+def run(arguments):
+    """
+    Send the requests named by the arguments and return the exit status.
+
+    Argument:
+        arguments - the parsed command line arguments
+    """
+    if arguments.command == "generate":
+        if len(arguments.configs) == 0:
+            print("Error: No project config file was given")
+            return 1
+        requests = [{"command": "generate", "config": os.path.abspath(config), "streaming": arguments.streaming}
+                    for config in arguments.configs]
+    else:
+        requests = [{"command": arguments.command}]
+    status = 0
+    for request in requests:
+        try:
+            connection = connect(arguments.host, arguments.port, arguments.socket_path, arguments.timeout)
+        except OSError as e:
+            print("Error: Unable to connect to the ProjectConfig server because " + str(e))
+            return 1
+        try:
+            response = send_request(connection, request)
+        except (OSError, ValueError) as e:
+            print("Error: No valid response from the ProjectConfig server because " + str(e))
+            return 1
+        finally:
+            connection.close()
+        sys.stdout.write(response.get("output", ""))
+        if not response.get("succeeded", False):
+            print(response.get("message", "Error: The request failed"))
+            status = 1
+        elif "stats" in response:
+            print(json.dumps(response["stats"], indent=2, sort_keys=True))
+    return status
+
+
+if __name__ == '__main__':
+    """Run the client"""
+    sys.exit(run(parse_arguments(sys.argv[1:])))
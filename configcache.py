@@ -0,0 +1,221 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module contains the ConfigCache class that keeps pickled snapshots of parsed
+project config files so that unchanged files are not parsed again.
+"""
+
+import hashlib
+import os
+import pickle
+from projectconfig import ProjectConfig
+
+# Increment when the layout of a cache entry changes.  Entries are also discarded
+# when the fields saved in a snapshot change.
+CACHE_VERSION = 3
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class ConfigCache:
+    """
+    This class loads project configurations through an on-disk cache.  An entry is
+    reused when the file has the same modification time and size as when it was
+    cached, or failing that, the same SHA-256 digest.  The base configurations it
+    extends must also have the modification times and sizes recorded in the entry.
+    """
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, cache_dir):
+        """Initialize the class.
+
+        Argument:
+            cache_dir - the directory that holds the cache entries.  It is created
+                if it does not exist.
+        """
+        assert cache_dir is not None, "Cache directory must not be None"
+        assert len(cache_dir) > 0, "Cache directory must not be an empty string"
+        self._cache_dir = cache_dir
+        self._hits = 0
+        self._misses = 0
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def cache_dir(self):
+        """Return the directory holding the cache entries"""
+        return self._cache_dir
+
+    @property
+    def hits(self):
+        """Return the number of configurations loaded from the cache"""
+        return self._hits
+
+    @property
+    def misses(self):
+        """Return the number of configurations that had to be parsed"""
+        return self._misses
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def load(self, project_config_filename):
+        """
+        Return a ProjectConfig for the file, taken from the cache if the file has
+        not changed, otherwise parsed and stored in the cache.
+
+        Argument:
+            project_config_filename - the full path to the project config file
+        """
+        if not ProjectConfig.file_exists(project_config_filename):
+            # Let the parser report the missing file in the usual way
+            return ConfigCache.parse(project_config_filename)
+        entry_name = self.entry_filename(project_config_filename)
+        stat = os.stat(project_config_filename)
+        entry = ConfigCache.read_entry(entry_name)
+        if entry is not None and not ConfigCache.bases_unchanged(entry):
+            entry = None
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            self._hits += 1
+            return ProjectConfig.from_snapshot(project_config_filename, entry["snapshot"],
+                                               ConfigCache.base_names(entry))
+        digest = ConfigCache.file_digest(project_config_filename)
+        if entry is not None and entry["digest"] == digest:
+            # The file was touched but not changed
+            snapshot = entry["snapshot"]
+            bases = entry["bases"]
+            self._hits += 1
+            project_config = ProjectConfig.from_snapshot(project_config_filename, snapshot,
+                                                         ConfigCache.base_names(entry))
+        else:
+            self._misses += 1
+            project_config = ConfigCache.parse(project_config_filename)
+            snapshot = project_config.snapshot()
+            bases = ProjectConfig.file_stamps(project_config.dependencies)
+        entry = {
+            "version": CACHE_VERSION,
+            "fields": ProjectConfig.snapshot_fields,
+            "filename": os.path.abspath(project_config_filename),
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "digest": digest,
+            "bases": bases,
+            "snapshot": snapshot
+        }
+        self.write_entry(entry_name, entry)
+        return project_config
+
+    def entry_filename(self, project_config_filename):
+        """
+        Return the name of the cache entry for a project config file.
+
+        Argument:
+            project_config_filename - the full path to the project config file
+        """
+        key = os.path.normcase(os.path.abspath(project_config_filename))
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".pickle"
+        return os.path.join(self._cache_dir, name)
+
+    def write_entry(self, entry_name, entry):
+        """
+        Write a cache entry.  The entry is written to a temporary file and renamed so
+        that a concurrent reader never sees a partial entry.  A cache that cannot be
+        written is not an error; the configuration is simply parsed next time.
+
+        Arguments:
+            entry_name - the name of the cache entry file
+            entry - the dictionary to be pickled
+        """
+        temp_name = entry_name + "." + str(os.getpid()) + ".tmp"
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(temp_name, mode="wb") as file:
+                pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, entry_name)
+        except OSError:
+            if os.path.exists(temp_name):
+                os.remove(temp_name)
+        return
+
+    @staticmethod
+    def read_entry(entry_name):
+        """
+        Return the cache entry in the file, or None if there is no usable entry.
+
+        Argument:
+            entry_name - the name of the cache entry file
+        """
+        try:
+            with open(entry_name, mode="rb") as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION:
+            return None
+        if entry.get("fields") != ProjectConfig.snapshot_fields:
+            return None
+        return entry
+
+    @staticmethod
+    def bases_unchanged(entry):
+        """Return true if the base configurations of a cache entry have the recorded
+        modification times and sizes"""
+        return ProjectConfig.file_stamps(ConfigCache.base_names(entry)) == entry["bases"]
+
+    @staticmethod
+    def base_names(entry):
+        """Return the file names of the base configurations of a cache entry"""
+        return [stamp[0] for stamp in entry["bases"]]
+
+    @staticmethod
+    def parse(project_config_filename):
+        """
+        Return a newly parsed ProjectConfig.
+
+        Argument:
+            project_config_filename - the full path to the project config file
+        """
+        project_config = ProjectConfig(project_config_filename)
+        project_config.parse()
+        return project_config
+
+    @staticmethod
+    def file_digest(filename):
+        """
+        Return the SHA-256 digest of the content of a file.
+
+        Argument:
+            filename - the name of the file
+        """
+        digest = hashlib.sha256()
+        with open(filename, mode="rb") as file:
+            for block in iter(lambda: file.read(65536), b""):
+                digest.update(block)
+        return digest.hexdigest()
@@ -0,0 +1,206 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module contains the DirectoryCache class that answers directory existence
+checks from cached directory listings.
+"""
+
+import os
+import threading
+import instrumentation
+
+# Marks a parent directory that exists but cannot be listed
+_unlistable = object()
+
+# Marks a listing whose modification time is not known
+_unknown = object()
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class DirectoryCache:
+    """
+    This class answers the question "is this path an existing directory?" by listing
+    the parent directory once with os.scandir and keeping the names of its
+    subdirectories.  Parents that do not exist are remembered as well, so repeated
+    checks below a missing directory cost nothing.  The cache may be shared by
+    several threads.
+
+    A cache that revalidates checks the modification time of a listed directory
+    before each use and lists it again if it has changed, so a long running process
+    can keep the cache between runs.
+    """
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, revalidate=False):
+        """Initialize the class.
+
+        Argument:
+            revalidate - if true, a listing is used only while the modification time
+                of its directory is unchanged
+        """
+        self._revalidate = revalidate
+        self._listings = {}
+        self._mtimes = {}
+        self._roots = {}
+        self._scans = 0
+        self._lock = threading.Lock()
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def scans(self):
+        """Return the number of directories that have been listed"""
+        return self._scans
+
+    @property
+    def revalidate(self):
+        """Return true if listings are checked against the directory modification time"""
+        return self._revalidate
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def is_dir(self, dir_name):
+        """Return true if dir_name is an existing directory.
+
+        Argument:
+            dir_name - the name of a directory
+        """
+        assert dir_name is not None, "Directory name must not be None"
+        assert len(dir_name) > 0, "Directory name must not be an empty string"
+        parent, name = DirectoryCache.split(dir_name)
+        if len(name) == 0:
+            # A drive or file system root has no parent to list
+            with self._lock:
+                if parent in self._roots:
+                    return self._roots[parent]
+            instrumentation.recorder.count("stat")
+            result = os.path.isdir(parent)
+            with self._lock:
+                return self._roots.setdefault(parent, result)
+        listing = self.listing(parent)
+        if listing is _unlistable:
+            instrumentation.recorder.count("stat")
+            return os.path.isdir(dir_name)
+        return listing is not None and name in listing
+
+    def listing(self, dir_name):
+        """Return the set of subdirectory names in a directory, normalized for case,
+        or None if the directory does not exist.  The directory is listed without
+        holding the lock, so slow listings on different threads overlap.
+
+        Argument:
+            dir_name - the name of the directory to be listed
+        """
+        key = os.path.normcase(dir_name)
+        mtime = None
+        if self._revalidate:
+            mtime = DirectoryCache.modification_time(dir_name)
+        with self._lock:
+            if key in self._listings:
+                if not self._revalidate or self._mtimes.get(key, _unknown) == mtime:
+                    return self._listings[key]
+            self._scans += 1
+        instrumentation.recorder.count("scandir")
+        try:
+            with os.scandir(dir_name) as entries:
+                names = set()
+                for entry in entries:
+                    if entry.is_dir():
+                        names.add(os.path.normcase(entry.name))
+            listing = names
+        except (FileNotFoundError, NotADirectoryError):
+            listing = None
+        except PermissionError:
+            listing = _unlistable
+        with self._lock:
+            if self._revalidate:
+                # The time read before the listing, so a change during it is seen
+                self._mtimes[key] = mtime
+                self._listings[key] = listing
+                return listing
+            return self._listings.setdefault(key, listing)
+
+    def add(self, dir_name):
+        """Record that a directory has been created.
+
+        Argument:
+            dir_name - the name of the new directory
+        """
+        parent, name = DirectoryCache.split(dir_name)
+        with self._lock:
+            if len(name) == 0:
+                self._roots[parent] = True
+                return
+            key = os.path.normcase(parent)
+            listing = self._listings.get(key)
+            if isinstance(listing, set):
+                listing.add(name)
+            elif listing is None and key in self._listings:
+                # The parent must exist now as well
+                del self._listings[key]
+            self._listings[os.path.normcase(os.path.normpath(dir_name))] = set()
+        return
+
+    def clear(self):
+        """Forget every cached listing"""
+        with self._lock:
+            self._listings = {}
+            self._mtimes = {}
+            self._roots = {}
+        return
+
+    @staticmethod
+    def modification_time(dir_name):
+        """Return the modification time of a directory in nanoseconds, or None if it
+        does not exist.
+
+        Argument:
+            dir_name - the name of the directory
+        """
+        instrumentation.recorder.count("stat")
+        try:
+            return os.stat(dir_name).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def split(dir_name):
+        """Return the parent of a directory and its own name, normalized for case.
+
+        Argument:
+            dir_name - the name of a directory
+        """
+        path = os.path.normpath(dir_name)
+        parent, name = os.path.split(path)
+        if len(parent) == 0:
+            parent = os.curdir
+        return parent, os.path.normcase(name)
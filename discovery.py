@@ -0,0 +1,176 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module discovers the test suites of a project from the subdirectories of its
+test suite directory, for configurations with a DiscoverSuites element.  The
+listing is kept in an index file in the project directory and the directory is
+only listed again when its modification time changes.
+"""
+
+import fnmatch
+import os
+import time
+import instrumentation
+from filecreator import ProjectIndex
+from filecreator import racy_seconds
+from projectconfigexception import ProjectConfigException
+
+# Name of the file in the project directory that holds the suite index
+suite_index_name = ".projectconfig-suites.json"
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class SuiteIndex(ProjectIndex):
+    """
+    This class keeps the names of the subdirectories of test suite directories
+    together with the modification time of each directory when it was listed.
+    """
+
+    index_name = suite_index_name
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, filename):
+        """Initialize the class.
+
+        Argument:
+            filename - the full path name of the index file
+        """
+        self._scans = 0
+        super(SuiteIndex, self).__init__(filename)
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def scans(self):
+        """Return the number of directories listed"""
+        return self._scans
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def clear(self):
+        """Forget the listed directories"""
+        self._directories = {}
+        return
+
+    def read(self, data):
+        """Set the listed directories from the index file.
+
+        Argument:
+            data - the dictionary read from the file
+        """
+        self._directories = data["directories"]
+        return
+
+    def data(self):
+        """Return the dictionary written to the index file"""
+        return {"version": 1, "directories": self._directories}
+
+    def names(self, dir_name):
+        """
+        Return the sorted names of the subdirectories of a directory, from the index
+        if the directory has not changed since it was listed.
+
+        Argument:
+            dir_name - the name of the directory
+        """
+        instrumentation.recorder.count("stat")
+        try:
+            mtime = os.stat(dir_name).st_mtime_ns
+        except OSError:
+            message = "Test suite directory does not exist - " + dir_name
+            raise ProjectConfigException(message)
+        key = os.path.normcase(dir_name)
+        entry = self._directories.get(key)
+        if entry is not None and entry["mtime_ns"] == mtime:
+            return entry["names"]
+        self._scans += 1
+        instrumentation.recorder.count("scandir")
+        names = []
+        with os.scandir(dir_name) as entries:
+            for dir_entry in entries:
+                if dir_entry.is_dir():
+                    names.append(dir_entry.name)
+        names.sort()
+        if time.time() - mtime / 1e9 < racy_seconds:
+            # Changed too recently to trust; list it again next time
+            mtime = None
+        self._directories[key] = {"mtime_ns": mtime, "names": names}
+        self._changed = True
+        return names
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def discover(project_config, index=None):
+    """
+    Find the test suites of a configuration with a DiscoverSuites element, set them
+    on the configuration and return them.  The project directory must exist if the
+    index of the project is used.
+
+    Arguments:
+        project_config - a configuration with a single combination
+        index - the SuiteIndex to use, or None to use and save the index of the
+            project directory
+    """
+    includes, excludes = project_config.discovery
+    suite_dir = project_config.root + "/TESTSUITES/" + project_config.product + "/" + \
+        project_config.test_suite_directory
+    save = index is None
+    if index is None:
+        index = SuiteIndex.for_project(project_config)
+    test_suites = select(index.names(suite_dir), includes, excludes)
+    if save:
+        index.save()
+    project_config.set_discovered_suites(test_suites)
+    return test_suites
+
+
+def select(names, includes, excludes):
+    """
+    Return the names that match an include pattern and no exclude pattern.
+
+    Arguments:
+        names - the names of the suite directories
+        includes - the list of shell style patterns of suites to include
+        excludes - the list of shell style patterns of suites to exclude
+    """
+    selected = []
+    for name in names:
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in includes):
+            continue
+        if any(fnmatch.fnmatch(name, pattern) for pattern in excludes):
+            continue
+        selected.append(name)
+    return selected
@@ -0,0 +1,244 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module contains the DurationIndex class that records how long each test suite
+took to run, as reported in its JUnit reports.
+"""
+
+import math
+import os
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+from filecreator import FileCreator
+from filecreator import ProjectIndex
+from filecreator import racy_seconds
+import reports
+
+# Name of the file in the project directory that holds the duration index
+durations_name = "durations.json"
+
+# Duration in seconds assumed for a suite when no suite has a history
+default_duration = 60.0
+
+# Number of recent run times kept for each suite
+history_size = 20
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class DurationIndex(ProjectIndex):
+    """
+    This class keeps the recent run times of each test suite, taken from the reports
+    in its reports directory.  The modification times of the directories and the
+    report files of each suite are recorded, and a directory is only listed again
+    when one of them has changed, which covers a report overwritten in place.  The
+    reports of a suite are only read again when one of them has a newer modification
+    time than the one recorded.
+    """
+
+    index_name = durations_name
+
+    versions = (1, 2, 3, 4)
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def default(self):
+        """Return the duration assumed for a suite without a history: the median of
+        the recorded durations, or a fixed default if there are none."""
+        if self._default is None:
+            if len(self._entries) == 0:
+                self._default = default_duration
+            else:
+                self._default = statistics.median(entry[0] for entry in self._entries.values())
+        return self._default
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def duration(self, test_suite):
+        """Return the expected duration of a test suite in seconds.
+
+        Argument:
+            test_suite - the name of the test suite
+        """
+        entry = self._entries.get(test_suite)
+        if entry is None:
+            return self.default
+        return entry[0]
+
+    def percentile(self, test_suite, fraction):
+        """Return a percentile of the recent run times of a test suite in seconds, or
+        None if the suite has no history.  The nearest rank is used, so with few runs
+        a high percentile is the longest run.
+
+        Arguments:
+            test_suite - the name of the test suite
+            fraction - the percentile as a fraction, for example 0.95
+        """
+        entry = self._entries.get(test_suite)
+        if entry is None:
+            return None
+        history = sorted(entry[2])
+        rank = max(1, math.ceil(fraction * len(history)))
+        return history[rank - 1]
+
+    def has_history(self, test_suite):
+        """Return true if the index has a recorded duration for the test suite"""
+        return test_suite in self._entries
+
+    def clear(self):
+        """Forget the recorded durations"""
+        self._entries = {}
+        self._stamps = {}
+        self._default = None
+        return
+
+    def read(self, data):
+        """Set the durations from the index file.
+
+        Argument:
+            data - the dictionary read from the file
+        """
+        if data["version"] == 1:
+            # Version 1 kept only the last run time
+            self._entries = dict((name, entry + [[entry[0]]]) for name, entry in data["suites"].items())
+        elif data["version"] in (2, 3):
+            # Version 3 recorded only the times of the directories
+            self._entries = data["suites"]
+        else:
+            self._entries = data["suites"]
+            self._stamps = data["stamps"]
+        return
+
+    def data(self):
+        """Return the dictionary written to the index file"""
+        return {"version": 4, "suites": self._entries, "stamps": self._stamps}
+
+    def refresh(self, project_config, io_workers=4):
+        """Update the index from the reports directories of the test suites of a
+        project.  Suites that are no longer listed are dropped from the index.  The
+        test suites are read one at a time, so a streaming configuration is not held
+        in memory, and only a few suites are waiting for a thread at any time.
+
+        Arguments:
+            project_config - an instance of the ProjectConfig class.
+            io_workers - the number of threads that read reports
+        """
+        creator = FileCreator(project_config)
+        listed = set()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=io_workers) as executor:
+            for test_suite in creator.test_suites:
+                listed.add(test_suite)
+                pending.append(executor.submit(self.update, test_suite, creator.reports_dir(test_suite)))
+                if len(pending) >= io_workers * 4:
+                    pending.popleft().result()
+            while len(pending) > 0:
+                pending.popleft().result()
+        for names in (self._entries, self._stamps):
+            for test_suite in [name for name in names if name not in listed]:
+                del names[test_suite]
+                self._changed = True
+        self._default = None
+        return
+
+    def update(self, test_suite, reports_dir):
+        """Record the duration of a test suite if its reports are newer than the
+        recorded duration.  Nothing is listed or read if none of the directories and
+        report files of the suite has changed since they were last read.
+
+        Arguments:
+            test_suite - the name of the test suite
+            reports_dir - the reports directory of the test suite
+        """
+        if DurationIndex.stamps_unchanged(self._stamps.get(test_suite)):
+            return
+        stamps = []
+        report_files = reports.find_report_files(reports_dir, stamps)
+        self.record_stamps(test_suite, stamps)
+        if len(report_files) == 0:
+            return
+        mtime = reports.latest_mtime(report_files)
+        entry = self._entries.get(test_suite)
+        if entry is not None and entry[1] == mtime:
+            return
+        seconds = 0.0
+        found = False
+        for report_file in report_files:
+            summary = reports.read_report_summary(report_file)
+            if summary is not None:
+                seconds += summary.time
+                found = True
+        if found:
+            seconds = round(seconds, 3)
+            history = entry[2][-(history_size - 1):] if entry is not None else []
+            self._entries[test_suite] = [seconds, mtime, history + [seconds]]
+            self._changed = True
+        return
+
+    def record_stamps(self, test_suite, stamps):
+        """Record the modification times of the directories and report files of a
+        test suite.  Nothing is recorded for a suite without a reports directory, or
+        with a file changed too recently for its time to be trusted, and the index
+        only changes if the recorded times differ.
+
+        Arguments:
+            test_suite - the name of the test suite
+            stamps - the list of file names and modification times
+        """
+        now = time.time()
+        if len(stamps) == 0 or any(now - mtime / 1e9 < racy_seconds for _, mtime in stamps):
+            stamps = None
+        if self._stamps.get(test_suite) == stamps:
+            return
+        if stamps is None:
+            del self._stamps[test_suite]
+        else:
+            self._stamps[test_suite] = stamps
+        self._changed = True
+        return
+
+    @staticmethod
+    def stamps_unchanged(stamps):
+        """Return true if every recorded file has the recorded modification time.
+
+        Argument:
+            stamps - the list of file names and modification times, or None
+        """
+        if stamps is None:
+            return False
+        for filename, mtime in stamps:
+            instrumentation.recorder.count("stat")
+            try:
+                if os.stat(filename).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
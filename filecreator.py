@@ -22,33 +22,218 @@ __version__ = "1.01"
 This module contains the BatFileCreator and PropertiesCreator classes.
 """
 
+import hashlib
+import itertools
+import json
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import instrumentation
 from projectconfigexception import ProjectConfigException
 from string import Template
+import sharding
 
 rungfit_template = """
 SET DRIVE=${root_dir}
 ${java_list}
 """
 
+# The parallel version of rungfit.bat starts each group of test suites in the
+# background by calling itself with the :worker argument.  A worker writes the
+# exit code of java to a status file when it ends.  The main script counts the
+# status files to keep at most RUNGFIT_MAX workers running, waits for all of them,
+# and exits with 1 if any worker failed.
+rungfit_parallel_template = """
+@ECHO OFF
+IF "%~1"==":worker" GOTO worker
+SET DRIVE=${root_dir}
+SET RUNGFIT_SELF=%~f0
+SET RUNGFIT_MAX=${parallelism}
+SET RUNGFIT_STARTED=0
+SET RUNGFIT_STATUS=%TEMP%\\rungfit-%RANDOM%-%RANDOM%
+MKDIR "%RUNGFIT_STATUS%"
+${launch_list}
+CALL :wait 1
+SET RUNGFIT_RC=0
+FINDSTR /V /X "0" "%RUNGFIT_STATUS%\\*.rc" >NUL && SET RUNGFIT_RC=1
+RMDIR /S /Q "%RUNGFIT_STATUS%"
+EXIT /B %RUNGFIT_RC%
+
+:wait
+SET RUNGFIT_DONE=0
+FOR %%F IN ("%RUNGFIT_STATUS%\\*.rc") DO SET /A RUNGFIT_DONE+=1
+SET /A RUNGFIT_RUNNING=RUNGFIT_STARTED-RUNGFIT_DONE
+IF %RUNGFIT_RUNNING% LSS %~1 EXIT /B 0
+PING -n 2 127.0.0.1 >NUL
+GOTO wait
+
+:worker
+SET RUNGFIT_ID=%~2
+SET RUNGFIT_PROPS=
+:worker_args
+IF "%~3"=="" GOTO worker_run
+SET RUNGFIT_PROPS=%RUNGFIT_PROPS% -prop %DRIVE%%~3
+SHIFT /3
+GOTO worker_args
+:worker_run
+java  -ea -jar %DRIVE%\\EXEC\\runGFIT.jar%RUNGFIT_PROPS%
+>"%RUNGFIT_STATUS%\\%RUNGFIT_ID%.tmp" ECHO %ERRORLEVEL%
+MOVE /Y "%RUNGFIT_STATUS%\\%RUNGFIT_ID%.tmp" "%RUNGFIT_STATUS%\\%RUNGFIT_ID%.rc" >NUL
+EXIT /B 0
+"""
+
+launch_template = """
+CALL :wait %RUNGFIT_MAX%
+SET /A RUNGFIT_STARTED+=1
+START "rungfit %RUNGFIT_STARTED%" /B CMD /C ""%RUNGFIT_SELF%" :worker %RUNGFIT_STARTED% ${property_files}"
+"""
+
 java_templte = """
 java  -ea -jar %DRIVE%\\EXEC\\runGFIT.jar -prop %DRIVE%${property_file}
 """
 
+java_batch_template = """
+java  -ea -jar %DRIVE%\\EXEC\\runGFIT.jar ${prop_list}
+"""
+
+prop_template = "-prop %DRIVE%${property_file}"
+
+# Longest java command line after %DRIVE% is expanded, kept below the 8191
+# character limit of cmd.exe
+max_java_line = 8000
+
 properties_template = """
 url=${url}
 username=su
 password=P@ssw0rd
 testsuite=${testsuite}
 reports=${reports}
-timeout=9600000
+timeout=${timeout}
 """
 
+# Percentile of the recent run times of a suite that its timeout is based on
+timeout_percentile = 0.95
+
 ports = {
     "bc": "8580",
     "cc": "8080",
     "pc": "8180"
 }
 
+# Name of the file in the project directory that records the generated files
+manifest_name = ".projectconfig-manifest.json"
+
+# A file changed less than this many seconds before it was read is not trusted by
+# the indexes, since a further change could leave the modification time the same
+racy_seconds = 2.0
+
+# Suffix of the list of the test suites written next to the batch file of a shard
+suites_suffix = ".suites"
+
+# Default number of threads writing staged files
+default_write_workers = 4
+
+# The templates are compiled once.  The batch file templates are split around the
+# list of java or launch lines so that the lines can be written one at a time.
+rungfit_head, rungfit_tail = [Template(part) for part in rungfit_template.split("${java_list}")]
+rungfit_parallel_head, rungfit_parallel_tail = \
+    [Template(part) for part in rungfit_parallel_template.split("${launch_list}")]
+launch_line_template = Template(launch_template)
+java_line_template = Template(java_templte)
+java_batch_line_template = Template(java_batch_template)
+prop_arg_template = Template(prop_template)
+properties_file_template = Template(properties_template)
+
+# -------------------------------------------------------------------------------
+#  Path Plan
+# -------------------------------------------------------------------------------
+
+
+class PathPlan:
+    """
+    This class holds every path prefix of a project, computed once from the project
+    configuration, so that the path of each test suite is a single concatenation.
+    A path plan cannot be changed once it is created.
+    """
+
+    __slots__ = ("drive", "project_dir", "workspace_path", "run_file", "property_prefix",
+                 "property_file_prefix", "test_suite_prefix", "reports_dir_prefix", "reports_prefix")
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, project_config):
+        """Initialize this class.
+
+        Argument:
+            project_config - an instance of the ProjectConfig class.
+        """
+        assert project_config is not None, "Project config instance must not be null"
+        pcf = project_config
+        drive = pcf.root.replace("/", "\\")
+        relative_dir = "\\" + pcf.environment + "\\" + pcf.product + "\\" + pcf.project + "\\"
+        reports_dir_prefix = pcf.workspace + "/" + pcf.environment + "/" + pcf.workspace_project + "/"
+        test_suite_prefix = pcf.root + "/" + "TESTSUITES/" + pcf.product + "/" + \
+            pcf.test_suite_directory + "/"
+        self._set("drive", drive)
+        self._set("project_dir", drive + "\\" + pcf.environment + "\\" + pcf.product + "\\" + pcf.project)
+        self._set("workspace_path",
+                  (pcf.workspace + "/" + pcf.environment + "/" + pcf.workspace_project).replace("/", "\\"))
+        self._set("run_file", self.project_dir + "\\rungfit.bat")
+        self._set("property_prefix", relative_dir.replace("/", "\\"))
+        self._set("property_file_prefix", (pcf.root + relative_dir).replace("/", "\\"))
+        self._set("test_suite_prefix", PathPlan.double_backslash(test_suite_prefix))
+        self._set("reports_dir_prefix", reports_dir_prefix)
+        self._set("reports_prefix", PathPlan.double_backslash(reports_dir_prefix))
+        return
+
+    def _set(self, name, value):
+        """Set an attribute while the plan is being built"""
+        object.__setattr__(self, name, value)
+        return
+
+    def __setattr__(self, name, value):
+        """Refuse to change the plan"""
+        raise AttributeError("A PathPlan cannot be changed - " + name)
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def property_filename(self, test_suite):
+        """Return the path of the properties file relative to the drive"""
+        return self.property_prefix + test_suite.replace("/", "\\") + ".properties"
+
+    def property_file_path(self, test_suite):
+        """Return the full path name of the properties file"""
+        return self.property_file_prefix + test_suite.replace("/", "\\") + ".properties"
+
+    def test_suite_path(self, test_suite):
+        """Return the path of the test suite as written in a properties file"""
+        return self.test_suite_prefix + PathPlan.double_backslash(test_suite)
+
+    def reports_dir(self, test_suite):
+        """Return the path of the reports directory of the test suite"""
+        return self.reports_dir_prefix + test_suite
+
+    def reports_path(self, test_suite):
+        """Return the path of the reports directory as written in a properties file"""
+        return self.reports_prefix + PathPlan.double_backslash(test_suite)
+
+    @staticmethod
+    def double_backslash(path):
+        """In a path, make sure all separators are double \\
+
+        Argument:
+            path - a path with possible \\ and / separators
+        """
+        path = path.replace("\\", "/")
+        path = path.replace("/", "\\\\")
+        return path
+
 # -------------------------------------------------------------------------------
 #  File Creator
 # -------------------------------------------------------------------------------
@@ -61,17 +246,23 @@ class FileCreator:
     #  Constructor
     # ---------------------------------------------------------------------------
 
-    def __init__(self, project_config):
+    def __init__(self, project_config, sink=None, durations=None):
         """Initialize this class.
 
         Argument:
             project_config - an instance of the ProjectConfig class.
+            sink - the object that receives the files: an OutputManifest, which
+                skips unchanged files, or any object with the write_stream and
+                prune methods of OutputManifest.  None writes every file.
+            durations - a DurationIndex used to balance the work, or None.
         """
         assert project_config is not None, "Project config instance must not be null"
         self._project_config = project_config
-        self._drive = None
-        self._project_dir = None
+        self._sink = sink
+        self._durations = durations
+        self._plan = None
         self._test_suites = None
+        self._selected = None
         return
 
     # ---------------------------------------------------------------------------
@@ -83,25 +274,32 @@ class FileCreator:
         """Return the instnace of the product config"""
         return self._project_config
 
+    @property
+    def plan(self):
+        """Return the PathPlan of the project"""
+        if self._plan is None:
+            self._plan = PathPlan(self.pcf)
+        return self._plan
+
     @property
     def drive(self):
         """Return the path to the root of the exec folders, including the GFIT directory name"""
-        if self._drive is None:
-            self._drive = self.pcf.root
-            self._drive = self._drive.replace("/", "\\")
-        return self._drive
+        return self.plan.drive
 
     @property
     def project_dir(self):
         """Return the path including the project dire"""
-        if self._project_dir is None:
-            self._project_dir = self.drive + "\\" + self.pcf.environment + "\\" + \
-                                self.pcf.product + "\\" + self.pcf.project
-        return self._project_dir
+        return self.plan.project_dir
 
     @property
     def test_suites(self):
-        """Return a list of test suites"""
+        """Return a list of test suites, or the selected test suites if some were
+        selected.  For a streaming project config, return a new iterator over the
+        test suites on each call instead."""
+        if self._selected is not None:
+            return self._selected
+        if self.pcf.streaming:
+            return self.pcf.test_suites
         if self._test_suites is None:
             self._test_suites = self.pcf.test_suites
         return self._test_suites
@@ -114,10 +312,24 @@ class FileCreator:
         prod = prod.lower()
         return prod
 
+    @property
+    def selected(self):
+        """Return true if only some of the test suites were selected"""
+        return self._selected is not None
+
     # ---------------------------------------------------------------------------
     #  Operations
     # ---------------------------------------------------------------------------
 
+    def select(self, test_suites):
+        """Generate files for only some of the test suites.
+
+        Argument:
+            test_suites - the names of the selected test suites
+        """
+        self._selected = list(test_suites)
+        return
+
     @staticmethod
     def open_file(filename):
         """Open the rungfit.bat file for writing.
@@ -132,15 +344,67 @@ class FileCreator:
             raise ProjectConfigException(message)
         return file
 
+    def write_file(self, filename, content):
+        """Write the content to a file, or pass it to the sink.
+
+        Arguments:
+            filename - the full path name of the file
+            content - the text to be written
+        """
+        self.write_stream(filename, lambda: [content])
+        return
+
+    def write_stream(self, filename, generate):
+        """Write the chunks of text produced by a generator function to a file, or
+        pass them to the sink.  The content is never held in memory as a whole.
+
+        Arguments:
+            filename - the full path name of the file
+            generate - a function without arguments that returns an iterator over
+                the chunks of the content.  It may be called more than once.
+        """
+        if self._sink is not None:
+            self._sink.write_stream(filename, generate)
+            return
+        FileCreator.write_chunks(filename, generate())
+        return
+
+    @staticmethod
+    def write_chunks(filename, chunks, sync=False):
+        """Write chunks of text to a file.
+
+        Arguments:
+            filename - the full path name of the file
+            chunks - an iterator over the chunks of the content
+            sync - if true, the file is forced to disk before it is closed
+        """
+        file = None
+        try:
+            file = FileCreator.open_file(filename)
+            for chunk in chunks:
+                file.write(chunk)
+            if sync:
+                file.flush()
+                os.fsync(file.fileno())
+            if instrumentation.recorder.enabled:
+                instrumentation.recorder.count("files_written")
+                instrumentation.recorder.count("bytes_written", file.tell())
+        finally:
+            if file is not None:
+                file.close()
+        return
+
+    def reports_dir(self, test_suite):
+        """Return the path of the directory that receives the reports of a test suite.
+
+        Argument:
+            test_suite - the name of the test suite
+        """
+        return self.plan.reports_dir(test_suite)
+
     def generate_property_filename(self, test_suite):
         """Return the full path name of the properties file"""
-        path = "\\"
-        path += self.pcf.environment + "\\"
-        path += self.pcf.product + "\\"
-        path += self.pcf.project + "\\"
-        path += test_suite + ".properties"
-        path = path.replace("/", "\\")
-        return path
+        return self.plan.property_filename(test_suite)
 
 # -------------------------------------------------------------------------------
 #  BatFileCreator
@@ -154,13 +418,17 @@ class BatFileCreator(FileCreator):
     #  Constructor
     # ---------------------------------------------------------------------------
 
-    def __init__(self, project_config):
+    def __init__(self, project_config, sink=None, durations=None):
         """Initialize this class.
 
         Argument:
             project_config - an instance of the ProjectConfig class.
+            sink - an OutputManifest or other sink, or None to write every file.
+            durations - a DurationIndex used to balance shards and parallel runs, or
+                None to keep the suites in the order they are listed.
         """
-        super(BatFileCreator, self).__init__(project_config)
+        super(BatFileCreator, self).__init__(project_config, sink, durations)
+        self._rerun_created = False
         return
 
     # ---------------------------------------------------------------------------
@@ -173,42 +441,222 @@ class BatFileCreator(FileCreator):
         path = self.project_dir + "/" + "rungfit.bat"
         return path
 
+    def shard_file_name(self, index):
+        """Return the full path name of the batch file for one shard.
+
+        Argument:
+            index - the number of the shard, starting at 1
+        """
+        path = self.project_dir + "\\" + "rungfit-shard" + str(index) + ".bat"
+        return path
+
+    @property
+    def rerun_file_name(self):
+        """Return the full path name of the batch file that reruns failed suites"""
+        path = self.project_dir + "\\" + "rungfit-rerun.bat"
+        return path
+
     # ---------------------------------------------------------------------------
     #  Operations
     # ---------------------------------------------------------------------------
 
     def create_rungfit(self):
         """Generate the rungfit.bat file in the project directory"""
-        file = None
-        try:
-            file = FileCreator.open_file(self.file_name)
-            content = self.generate_content()
-            file.write(content)
-        except ProjectConfigException as e:
-            raise e
-        finally:
-            if file is not None:
-                file.close()
+        self.write_stream(self.file_name, self.iter_content)
+        return
 
-    def generate_content(self):
-        """Return the content of the rungfit.bat file"""
-        java_lines = ""
-        for test_suite in self.test_suites:
-            java_line = self.generate_java_line(test_suite)
-            java_lines += java_line + "\n"
+    def create_rerun(self, test_suites):
+        """Generate the rungfit-rerun.bat file that runs only some of the test suites.
+        It is kept when create_shards deletes obsolete batch files.
+
+        Argument:
+            test_suites - the test suites to be run again
+        """
+        self.write_stream(self.rerun_file_name, partial(self.iter_content, list(test_suites)))
+        self._rerun_created = True
+        return
+
+    def create_shards(self):
+        """Generate one batch file for each shard of the test suites, and next to it
+        the list of the suites of the shard, from which the reports of the shard are
+        merged.  Files of shards that are no longer needed, and a rerun batch file
+        that was not generated in this run, are deleted.
+
+        Returns:
+            The list of full path names of the shard batch files.  The list is empty
+            when the project is not sharded.
+        """
+        file_names = []
+        if self.pcf.shards > 1:
+            if self._durations is not None:
+                shards = sharding.pack_longest_first(self.test_suites, self.pcf.shards,
+                                                     self._durations.duration)
+            else:
+                shards = sharding.split_round_robin(self.test_suites, self.pcf.shards)
+            for index, shard in enumerate(shards, start=1):
+                file_name = self.shard_file_name(index)
+                self.write_stream(file_name, partial(self.iter_content, shard))
+                self.write_stream(suites_file_name(file_name), partial(iter_suite_lines, shard))
+                file_names.append(file_name)
+        if self._sink is not None:
+            keep = set(file_names) | {self.file_name}
+            if self._rerun_created:
+                keep.add(self.rerun_file_name)
+            self._sink.prune(keep, ".bat")
+            self._sink.prune(set(suites_file_name(file_name) for file_name in file_names), suites_suffix)
+        return file_names
+
+    def generate_content(self, test_suites=None):
+        """Return the content of the rungfit.bat file.
+
+        Argument:
+            test_suites - the test suites to be run, or None for all of them
+        """
+        return "".join(self.iter_content(test_suites))
+
+    def iter_content(self, test_suites=None):
+        """Return an iterator over the chunks of the content of the rungfit.bat file.
+
+        Argument:
+            test_suites - the test suites to be run, or None for all of them
+        """
+        if self.pcf.parallelism > 1:
+            yield from self.iter_parallel_content(test_suites)
+            return
+        subs = {"root_dir": self.drive}
+        yield rungfit_head.substitute(subs)
+        for group in self.group_test_suites(test_suites):
+            if len(group) == 1:
+                java_line = self.generate_java_line(group[0])
+            else:
+                java_line = self.generate_java_batch_line(group)
+            yield java_line + "\n"
+        yield rungfit_tail.substitute(subs)
+
+    def generate_parallel_content(self, test_suites=None):
+        """Return the content of a rungfit.bat file that runs up to Parallelism groups
+        of test suites at the same time.
+
+        Argument:
+            test_suites - the test suites to be run, or None for all of them
+        """
+        return "".join(self.iter_parallel_content(test_suites))
+
+    def iter_parallel_content(self, test_suites=None):
+        """Return an iterator over the chunks of the content of a parallel rungfit.bat
+        file.
+
+        Argument:
+            test_suites - the test suites to be run, or None for all of them
+        """
+        if self._durations is not None:
+            groups = self.balance_groups(test_suites)
+        else:
+            groups = self.group_test_suites(test_suites)
         subs = {"root_dir": self.drive,
-                "java_list": java_lines}
-        content = Template(rungfit_template).substitute(subs)
-        return content
+                "parallelism": str(self.pcf.parallelism)}
+        yield rungfit_parallel_head.substitute(subs)
+        for group in groups:
+            yield self.generate_launch_line(group)
+        yield rungfit_parallel_tail.substitute(subs)
+
+    def balance_groups(self, test_suites=None):
+        """Return the groups of test suites of a parallel run in the order they are
+        started.  The suites are packed longest first into one list for each of the
+        Parallelism workers, each list is cut into groups of at most SuitesPerJvm
+        suites, and the groups are started longest first.  The longest suites are
+        therefore spread over the workers rather than put in the same group.
+
+        Argument:
+            test_suites - the test suites to be grouped, or None for all of them
+        """
+        if test_suites is None:
+            test_suites = self.test_suites
+        duration = self._durations.duration
+        if self.pcf.suites_per_jvm == 1:
+            ordered = sharding.order_longest_first(test_suites, duration)
+            return [[test_suite] for test_suite in ordered]
+        groups = []
+        for worker_suites in sharding.pack_longest_first(test_suites, self.pcf.parallelism, duration):
+            groups.extend(self.group_test_suites(worker_suites))
+        return sorted(groups, key=lambda group: sum(duration(test_suite) for test_suite in group), reverse=True)
+
+    def generate_launch_line(self, test_suites):
+        """Return the lines that start a background worker for a group of test suites.
+
+        Argument:
+            test_suites - the names of the test suites run by the worker
+        """
+        property_files = []
+        for test_suite in test_suites:
+            property_files.append('"' + self.generate_property_filename(test_suite) + '"')
+        subs = {
+            "property_files": " ".join(property_files)
+        }
+        launch_line = launch_line_template.substitute(subs)
+        return launch_line
 
     def generate_java_line(self, test_suite):
         """Return the content of the call to the java .jar file"""
         subs = {
             "property_file": self.generate_property_filename(test_suite)
         }
-        java_line = Template(java_templte).substitute(subs)
+        java_line = java_line_template.substitute(subs)
         return java_line
 
+    def generate_java_batch_line(self, test_suites):
+        """Return the content of a call to the java .jar file that runs several test
+        suites in one Java virtual machine.
+
+        Argument:
+            test_suites - the names of the test suites
+        """
+        props = []
+        for test_suite in test_suites:
+            subs = {
+                "property_file": self.generate_property_filename(test_suite)
+            }
+            props.append(prop_arg_template.substitute(subs))
+        subs = {
+            "prop_list": " ".join(props)
+        }
+        java_line = java_batch_line_template.substitute(subs)
+        return java_line
+
+    def group_test_suites(self, test_suites=None):
+        """Return an iterator over lists of test suites, each list to be run by one
+        Java virtual machine.  A list holds at most SuitesPerJvm suites and is cut
+        short if its command line would be too long for cmd.exe once %DRIVE% is
+        expanded in the java line and in each property file argument.
+
+        Argument:
+            test_suites - the test suites to be grouped, or None for all of them
+        """
+        size = self.pcf.suites_per_jvm
+        if test_suites is None:
+            test_suites = self.test_suites
+        suites = iter(test_suites)
+        if size == 1:
+            for test_suite in suites:
+                yield [test_suite]
+            return
+        drive_length = len(self.drive)
+        head_length = len("java  -ea -jar ") + drive_length + len("\\EXEC\\runGFIT.jar")
+        while True:
+            group = list(itertools.islice(suites, size))
+            if len(group) == 0:
+                return
+            start = 0
+            length = head_length
+            for index, test_suite in enumerate(group):
+                arg_length = len(" -prop ") + drive_length + len(self.generate_property_filename(test_suite))
+                if index > start and length + arg_length > max_java_line:
+                    yield group[start:index]
+                    start = index
+                    length = head_length
+                length += arg_length
+            yield group[start:]
+
 # -------------------------------------------------------------------------------
 #  Property Creator
 # -------------------------------------------------------------------------------
@@ -223,13 +671,16 @@ class PropertyCreator(FileCreator):
     #  Constructor
     # ---------------------------------------------------------------------------
 
-    def __init__(self, project_config):
+    def __init__(self, project_config, sink=None, durations=None):
         """Initialize this class.
 
         Argument:
             project_config - an instance of the ProjectConfig class.
+            sink - an OutputManifest or other sink, or None to write every file.
+            durations - a DurationIndex with the recent run times of the suites, or
+                None to give each suite without its own timeout the longest one.
         """
-        super(PropertyCreator, self).__init__(project_config)
+        super(PropertyCreator, self).__init__(project_config, sink, durations)
         return
 
     # ---------------------------------------------------------------------------
@@ -241,9 +692,16 @@ class PropertyCreator(FileCreator):
     # ---------------------------------------------------------------------------
 
     def create_properties_files(self):
-        """Create the required properties files"""
+        """Create the required properties files.  If there is a sink, it is asked to
+        prune the properties files of test suites that are no longer listed.  The
+        properties files of listed suites that were not selected are kept."""
+        filenames = set()
         for test_suite in self.test_suites:
-            self.create_properties_file(test_suite)
+            filenames.add(self.create_properties_file(test_suite))
+        if self.selected:
+            filenames.update(self.generate_property_filename(test_suite) for test_suite in self.pcf.test_suites)
+        if self._sink is not None:
+            self._sink.prune(filenames, ".properties")
         return
 
     def create_properties_file(self, test_suite):
@@ -251,17 +709,14 @@ class PropertyCreator(FileCreator):
 
         Argument:
             test_suite - the name of the test suite
+
+        Returns:
+            The full path name of the properties file.
         """
-        file = None
-        try:
-            file = FileCreator.open_file(self.generate_property_filename(test_suite))
-            content = self.generate_content(test_suite)
-            file.write(content)
-        except ProjectConfigException as e:
-            raise e
-        finally:
-            if file is not None:
-                file.close()
+        filename = self.generate_property_filename(test_suite)
+        content = self.generate_content(test_suite)
+        self.write_file(filename, content)
+        return filename
 
     def generate_property_filename(self, test_suite):
         """Generate the full file name of the property.
@@ -269,13 +724,7 @@ class PropertyCreator(FileCreator):
         Argument:
             test_suite - the name of the test suite
         """
-        path = self.pcf.root + "\\"
-        path += self.pcf.environment + "\\"
-        path += self.pcf.product + "\\"
-        path += self.pcf.project + "\\"
-        path += test_suite + ".properties"
-        path = path.replace("/", "\\")
-        return path
+        return self.plan.property_file_path(test_suite)
 
     def generate_content(self, test_suite):
         """
@@ -290,9 +739,10 @@ class PropertyCreator(FileCreator):
         subs = {
             "url": url,
             "testsuite": ts,
-            "reports": reports
+            "reports": reports,
+            "timeout": str(self.generate_timeout(test_suite))
         }
-        content = Template(properties_template).substitute(subs)
+        content = properties_file_template.substitute(subs)
         return content
 
     def generate_url(self):
@@ -304,15 +754,31 @@ class PropertyCreator(FileCreator):
         url = "http://" + self.pcf.server + ":" + ports[product] + "/" + product
         return url
 
+    def generate_timeout(self, test_suite):
+        """
+        Return the timeout of the test suite in milliseconds.  A timeout given for
+        the suite in the project config is used as it is.  Otherwise it is the 95th
+        percentile of the recent run times times the factor, kept between the floor
+        and the ceiling.  A suite without a history gets the ceiling.
+
+        Argument:
+            test_suite - the name of the test suite
+        """
+        timeout = self.pcf.timeouts.get(test_suite)
+        if timeout is None:
+            factor, floor, ceiling = self.pcf.timeout_policy
+            timeout = ceiling
+            if self._durations is not None:
+                seconds = self._durations.percentile(test_suite, timeout_percentile)
+                if seconds is not None:
+                    timeout = min(max(int(math.ceil(seconds * factor)), floor), ceiling)
+        return timeout * 1000
+
     def generate_test_suite_path(self, test_suite):
         """
         Generate the full path to the test suite
         """
-        path = self.pcf.root + "/" + "TESTSUITES/" + self.pcf.product
-        path += "/" + self.pcf.test_suite_directory
-        path += "/" + test_suite
-        path = PropertyCreator.double_backslash(path)
-        return path
+        return self.plan.test_suite_path(test_suite)
 
     def generate_reports_path(self, test_suite):
         """Generate the path for reports.
@@ -320,10 +786,7 @@ class PropertyCreator(FileCreator):
         Argument:
             test_suite - the name of the test suite
         """
-        path = self.pcf.workspace + "/" + self.pcf.environment + "/"
-        path += self.pcf.project + "/" + test_suite
-        path = PropertyCreator.double_backslash(path)
-        return path
+        return self.plan.reports_path(test_suite)
 
     @staticmethod
     def double_backslash(path):
@@ -332,6 +795,512 @@ class PropertyCreator(FileCreator):
         Argument:
             path - a path with possible \ and / separators
         """
-        path = path.replace("\\", "/")
-        path = path.replace("/", "\\\\")
-        return path
+        return PathPlan.double_backslash(path)
+
+# -------------------------------------------------------------------------------
+#  Project Index
+# -------------------------------------------------------------------------------
+
+
+class ProjectIndex:
+    """
+    This class is the base of the JSON index files kept in a project directory.  A
+    missing or unreadable index, or one of a version that is not known, is treated
+    as empty.  The file is only written when the index has changed, and it is
+    replaced atomically.  A subclass names its file and reads and writes its data.
+    """
+
+    # Name of the index file in the project directory
+    index_name = None
+
+    # Versions of the index file that can be read
+    versions = (1,)
+
+    # Indentation of the written file, or None for the most compact form
+    indent = None
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, filename):
+        """Initialize this class.
+
+        Argument:
+            filename - the full path name of the index file
+        """
+        assert filename is not None, "Index filename must not be None"
+        self._filename = filename
+        self._changed = False
+        self.clear()
+        return
+
+    @classmethod
+    def for_project(cls, project_config, *args):
+        """Return the index of the project directory of a project configuration,
+        loaded from disk.
+
+        Arguments:
+            project_config - an instance of the ProjectConfig class.
+            args - the further arguments of the constructor of the subclass
+        """
+        filename = FileCreator(project_config).project_dir + "\\" + cls.index_name
+        index = cls(filename, *args)
+        index.load()
+        return index
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def filename(self):
+        """Return the full path name of the index file"""
+        return self._filename
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def load(self):
+        """Read the index file."""
+        self.clear()
+        try:
+            with open(self._filename, mode="r") as file:
+                data = json.load(file)
+            if data.get("version") in self.versions:
+                self.read(data)
+        except (OSError, ValueError, KeyError, AttributeError):
+            self.clear()
+        return
+
+    def save(self):
+        """Write the index file if it has changed"""
+        if not self._changed:
+            return
+        if self.indent is None:
+            text = json.dumps(self.data(), separators=(",", ":"), sort_keys=True)
+        else:
+            text = json.dumps(self.data(), indent=self.indent, sort_keys=True)
+        write_atomic(self._filename, [text])
+        self._changed = False
+        return
+
+    def clear(self):
+        """Empty the index"""
+        raise NotImplementedError("An index must define clear")
+
+    def read(self, data):
+        """Set the index from the data of the index file.
+
+        Argument:
+            data - the dictionary read from the file, of one of the known versions
+        """
+        raise NotImplementedError("An index must define read")
+
+    def data(self):
+        """Return the dictionary written to the index file, including its version"""
+        raise NotImplementedError("An index must define data")
+
+# -------------------------------------------------------------------------------
+#  Output Manifest
+# -------------------------------------------------------------------------------
+
+
+class OutputManifest(ProjectIndex):
+    """
+    This class records the content hash, size and modification time of each file
+    generated in a project directory.  A file is only rewritten when its new content
+    differs from the recorded content or the file was changed since it was written.
+    With a StagedWriter, changed files are staged and only replaced when the manifest
+    is saved.
+    """
+
+    index_name = manifest_name
+
+    indent = 1
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, filename, writer=None):
+        """Initialize this class.
+
+        Arguments:
+            filename - the full path name of the manifest file
+            writer - a StagedWriter for the changed files, or None to write them in
+                place at once
+        """
+        self._writer = writer
+        self._obsolete = []
+        self._written = 0
+        self._skipped = 0
+        self._pruned = 0
+        super(OutputManifest, self).__init__(filename)
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def written(self):
+        """Return the number of files written"""
+        return self._written
+
+    @property
+    def skipped(self):
+        """Return the number of files left alone because they had not changed"""
+        return self._skipped
+
+    @property
+    def pruned(self):
+        """Return the number of obsolete files deleted"""
+        return self._pruned
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def clear(self):
+        """Forget the recorded files, so every file is written"""
+        self._files = {}
+        return
+
+    def read(self, data):
+        """Set the recorded files from the manifest file.
+
+        Argument:
+            data - the dictionary read from the file
+        """
+        self._files = data["files"]
+        return
+
+    def data(self):
+        """Return the dictionary written to the manifest file"""
+        return {"version": 1, "files": self._files}
+
+    def save(self):
+        """Commit the staged files, delete the pruned files, and write the manifest
+        file if anything was recorded or removed"""
+        if self._writer is not None:
+            self._writer.commit()
+            obsolete = self._obsolete
+            self._obsolete = []
+            for filename in obsolete:
+                self.remove(filename)
+        super(OutputManifest, self).save()
+        return
+
+    def write_file(self, filename, content):
+        """Write the content to the file unless it is unchanged.
+
+        Arguments:
+            filename - the full path name of the file
+            content - the text to be written
+
+        Returns:
+            True if the file was written.
+        """
+        return self.write_stream(filename, lambda: [content])
+
+    def write_stream(self, filename, generate):
+        """Write the chunks produced by a generator function to the file unless the
+        content is unchanged.  The chunks are generated once to compute the digest
+        and, only if the file must be written, a second time to write them.
+
+        Arguments:
+            filename - the full path name of the file
+            generate - a function without arguments that returns an iterator over
+                the chunks of the content
+
+        Returns:
+            True if the file was written.
+        """
+        hasher = hashlib.sha256()
+        for chunk in generate():
+            hasher.update(chunk.encode("utf-8"))
+        digest = hasher.hexdigest()
+        if self.is_current(filename, digest):
+            self._skipped += 1
+            instrumentation.recorder.count("files_skipped")
+            return False
+        if self._writer is not None:
+            self._writer.stage(filename, generate, partial(self.record, filename, digest))
+        else:
+            FileCreator.write_chunks(filename, generate())
+            self.record(filename, digest)
+        self._written += 1
+        return True
+
+    def is_current(self, filename, digest):
+        """Return true if the file on disk is the one recorded with this digest.
+
+        Arguments:
+            filename - the full path name of the file
+            digest - the SHA-256 digest of the new content
+        """
+        entry = self._files.get(filename)
+        if entry is None or entry["digest"] != digest:
+            return False
+        instrumentation.recorder.count("stat")
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+        return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+    def record(self, filename, digest):
+        """Record a file that has just been written.
+
+        Arguments:
+            filename - the full path name of the file
+            digest - the SHA-256 digest of its content
+        """
+        instrumentation.recorder.count("stat")
+        stat = os.stat(filename)
+        self._files[filename] = {
+            "digest": digest,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns
+        }
+        self._changed = True
+        return
+
+    def prune(self, keep, suffix):
+        """Delete recorded files with the suffix that are not in the keep set.  Only
+        files recorded in the manifest are ever deleted.
+
+        Arguments:
+            keep - the set of file names that are still generated
+            suffix - the file name suffix of the files that may be deleted
+        """
+        obsolete = [name for name in self._files if name.endswith(suffix) and name not in keep]
+        for name in obsolete:
+            if self._writer is not None:
+                # The files in place may still refer to it until the commit
+                self._obsolete.append(name)
+            else:
+                self.remove(name)
+            del self._files[name]
+            self._changed = True
+        return
+
+    def remove(self, filename):
+        """Delete a generated file that is no longer needed.
+
+        Argument:
+            filename - the full path name of the file
+        """
+        try:
+            os.remove(filename)
+            self._pruned += 1
+            instrumentation.recorder.count("files_pruned")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            message = "Unable to delete " + filename + " because " + str(e)
+            raise ProjectConfigException(message)
+        return
+
+# -------------------------------------------------------------------------------
+#  Staged Writer
+# -------------------------------------------------------------------------------
+
+
+class StagedWriter:
+    """
+    This class writes files in two phases.  Each staged file is written by a pool
+    of threads to a temporary file in its target directory.  The commit method waits
+    for the writes and then renames every temporary file over its target.  If any
+    write fails, no file is renamed and the temporary files are deleted.
+    """
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, write_workers=default_write_workers, sync=False):
+        """Initialize the class.
+
+        Arguments:
+            write_workers - the most files written at the same time
+            sync - if true, each temporary file is forced to disk before it is renamed
+        """
+        assert write_workers > 0, "Number of write workers must be positive"
+        self._write_workers = write_workers
+        self._sync = sync
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(write_workers * 2)
+        self._staged = {}
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def write_workers(self):
+        """Return the most files written at the same time"""
+        return self._write_workers
+
+    @property
+    def pending(self):
+        """Return the number of staged files that are not yet committed"""
+        return len(self._staged)
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def stage(self, filename, generate, on_commit=None):
+        """
+        Start writing the content of a file to its temporary file.  Staging a file
+        again replaces the earlier content.  The caller waits while the pool has
+        twice as many files pending as it has threads, so memory does not grow with
+        the number of files.
+
+        Arguments:
+            filename - the full path name of the file
+            generate - a function without arguments that returns an iterator over
+                the chunks of the content
+            on_commit - a function without arguments called after the file has been
+                renamed into place, or None
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._write_workers)
+        previous = self._staged.get(filename)
+        if previous is not None:
+            # Both writes use the same temporary file
+            previous[1].exception()
+        temp_name = StagedWriter.temp_filename(filename)
+        self._slots.acquire()
+        future = self._executor.submit(FileCreator.write_chunks, temp_name, generate(), self._sync)
+        future.add_done_callback(lambda done: self._slots.release())
+        self._staged[filename] = (temp_name, future, on_commit)
+        return
+
+    def commit(self):
+        """
+        Wait for every staged file to be written and rename them into place.  If a
+        write failed, the temporary files are deleted and the first error is raised.
+        """
+        staged = self._staged
+        self._staged = {}
+        try:
+            errors = [future.exception() for temp_name, future, on_commit in staged.values()]
+            errors = [error for error in errors if error is not None]
+            if len(errors) > 0:
+                StagedWriter.discard(staged)
+                raise errors[0]
+            for filename, (temp_name, future, on_commit) in staged.items():
+                try:
+                    os.replace(temp_name, filename)
+                except OSError as e:
+                    StagedWriter.discard(staged)
+                    message = "Unable to replace " + filename + " because " + str(e)
+                    raise ProjectConfigException(message)
+                if on_commit is not None:
+                    on_commit()
+        finally:
+            self.close()
+        return
+
+    def close(self):
+        """Stop the threads of the pool.  Files staged later start a new pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        return
+
+    @staticmethod
+    def discard(staged):
+        """Delete the temporary files of staged files that were not renamed.
+
+        Argument:
+            staged - a dictionary of file name to temporary file name, future and
+                commit function
+        """
+        for temp_name, future, on_commit in staged.values():
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
+        return
+
+    @staticmethod
+    def temp_filename(filename):
+        """Return the name of the temporary file for a file, in the same directory"""
+        return filename + "." + str(os.getpid()) + ".tmp"
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def suites_file_name(run_file):
+    """
+    Return the full path name of the list of the test suites run by a batch file.
+
+    Argument:
+        run_file - the full path name of the batch file
+    """
+    return os.path.splitext(run_file)[0] + suites_suffix
+
+
+def iter_suite_lines(test_suites):
+    """
+    Return an iterator over the lines of a list of test suites, one name per line.
+
+    Argument:
+        test_suites - the names of the test suites
+    """
+    for test_suite in test_suites:
+        yield test_suite + "\n"
+
+
+def read_suites_file(filename):
+    """
+    Return the names of the test suites in a list written by a batch file creator.
+
+    Argument:
+        filename - the full path name of the list
+    """
+    try:
+        with open(filename, mode="r") as file:
+            return [line.strip() for line in file if len(line.strip()) > 0]
+    except OSError as e:
+        message = "Unable to read the test suites in " + filename + " because " + str(e)
+        raise ProjectConfigException(message)
+
+
+def write_atomic(filename, chunks, sync=False):
+    """
+    Write chunks of text to a temporary file and rename it over a file, so that a
+    reader sees either the old or the new content.
+
+    Arguments:
+        filename - the full path name of the file
+        chunks - an iterator over the chunks of the content
+        sync - if true, the file is forced to disk before it is renamed
+    """
+    temp_name = StagedWriter.temp_filename(filename)
+    try:
+        FileCreator.write_chunks(temp_name, chunks, sync)
+        os.replace(temp_name, filename)
+    except OSError as e:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        message = "Unable to replace " + filename + " because " + str(e)
+        raise ProjectConfigException(message)
+    except ProjectConfigException:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+    return
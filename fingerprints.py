@@ -0,0 +1,351 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module selects the test suites whose content changed since the last
+successful run.  The fingerprint of a suite is computed from the relative path,
+size and modification time of every file in its directory, or from the content
+hash of every file instead of its modification time.  A changed-only run records
+the fingerprints as pending; they become the baseline of the next run when the
+run is committed:
+
+    python main.py --changed-only cfg/project.xml
+    (run the tests)
+    python main.py --commit-baseline cfg/project.xml
+"""
+
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+from filecreator import ProjectIndex
+from filecreator import racy_seconds
+from projectconfigexception import ProjectConfigException
+
+# Name of the file in the project directory that holds the fingerprint index
+fingerprints_name = ".projectconfig-fingerprints.json"
+
+# Number of committed changed-only runs after which every suite is run again
+default_full_every = 10
+
+# Size of the blocks read when a file is hashed
+block_size = 1024 * 1024
+
+# -------------------------------------------------------------------------------
+#  Change Policy
+# -------------------------------------------------------------------------------
+
+
+class ChangePolicy:
+    """This class holds the settings of a changed-only run"""
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, full_every=default_full_every, hash_contents=False):
+        """Initialize the class.
+
+        Arguments:
+            full_every - the number of committed changed-only runs after which a
+                full run is forced
+            hash_contents - if true, a file changes only when its content changes,
+                not when its modification time does
+        """
+        assert full_every > 0, "Number of runs between full runs must be positive"
+        self._full_every = full_every
+        self._hash_contents = hash_contents
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def full_every(self):
+        """Return the number of changed-only runs between full runs"""
+        return self._full_every
+
+    @property
+    def hash_contents(self):
+        """Return true if files are compared by content hash"""
+        return self._hash_contents
+
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class FingerprintIndex(ProjectIndex):
+    """
+    This class keeps the fingerprints of the test suites of a project: the baseline
+    of the last committed run, the pending fingerprints of the run generated since,
+    and, when contents are hashed, the size, modification time and hash of each
+    file, so that only new or changed files are hashed again.
+    """
+
+    index_name = fingerprints_name
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, filename):
+        """Initialize the class.
+
+        Argument:
+            filename - the full path name of the index file
+        """
+        self._hashed = 0
+        super(FingerprintIndex, self).__init__(filename)
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def baseline(self):
+        """Return the dictionary of test suite to fingerprint of the last committed
+        run, or None if no run has been committed"""
+        return self._baseline
+
+    @property
+    def runs(self):
+        """Return the number of changed-only runs committed since the last full run"""
+        return self._runs
+
+    @property
+    def hashed(self):
+        """Return the number of files hashed"""
+        return self._hashed
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def clear(self):
+        """Forget the fingerprints, so the next run is a full run"""
+        self._baseline = None
+        self._pending = None
+        self._pending_full = False
+        self._runs = 0
+        self._files = {}
+        return
+
+    def read(self, data):
+        """Set the fingerprints from the index file.
+
+        Argument:
+            data - the dictionary read from the file
+        """
+        self._baseline = data.get("baseline")
+        self._pending = data.get("pending")
+        self._pending_full = data.get("pending_full", False)
+        self._runs = data.get("runs", 0)
+        self._files = data.get("files", {})
+        return
+
+    def data(self):
+        """Return the dictionary written to the index file"""
+        data = {
+            "version": 1,
+            "baseline": self._baseline,
+            "pending": self._pending,
+            "pending_full": self._pending_full,
+            "runs": self._runs,
+            "files": self._files
+        }
+        return data
+
+    def fingerprint_all(self, suite_root, test_suites, hash_contents=False, io_workers=4):
+        """
+        Return a dictionary of test suite to the fingerprint of its directory.  The
+        suites are fingerprinted concurrently.
+
+        Arguments:
+            suite_root - the directory that holds the test suites
+            test_suites - the names of the test suites
+            hash_contents - if true, fingerprint the content of the files rather
+                than their modification times
+            io_workers - the number of threads that read the directories
+        """
+        def scan(test_suite):
+            return FingerprintIndex.scan(suite_root + "/" + test_suite, self._files.get(test_suite, {}),
+                                         hash_contents)
+
+        with ThreadPoolExecutor(max_workers=io_workers) as executor:
+            results = list(executor.map(scan, test_suites))
+        fingerprints = {}
+        files = {}
+        for test_suite, (fingerprint, suite_files, hashed) in zip(test_suites, results):
+            fingerprints[test_suite] = fingerprint
+            self._hashed += hashed
+            if hash_contents:
+                files[test_suite] = suite_files
+        if files != self._files:
+            self._files = files
+            self._changed = True
+        return fingerprints
+
+    def changed_suites(self, test_suites, fingerprints):
+        """
+        Return the test suites whose fingerprint differs from the baseline, in the
+        order they are listed.
+
+        Arguments:
+            test_suites - the names of the test suites
+            fingerprints - the dictionary of test suite to its current fingerprint
+        """
+        baseline = self._baseline if self._baseline is not None else {}
+        return [test_suite for test_suite in test_suites if baseline.get(test_suite) != fingerprints[test_suite]]
+
+    def set_pending(self, fingerprints, full):
+        """
+        Record the fingerprints of the run just generated.  They become the baseline
+        when the run is committed.
+
+        Arguments:
+            fingerprints - the dictionary of test suite to fingerprint
+            full - true if every test suite is run
+        """
+        self._pending = fingerprints
+        self._pending_full = full
+        self._changed = True
+        return
+
+    def commit(self):
+        """
+        Make the pending fingerprints the baseline.  Return false if there is no
+        pending run.
+        """
+        if self._pending is None:
+            return False
+        self._baseline = self._pending
+        self._runs = 0 if self._pending_full else self._runs + 1
+        self._pending = None
+        self._pending_full = False
+        self._changed = True
+        return True
+
+    @staticmethod
+    def scan(suite_dir, old_files, hash_contents=False):
+        """
+        Return the fingerprint of a test suite directory, the table of its files
+        and the number of files hashed.
+
+        Arguments:
+            suite_dir - the directory of the test suite
+            old_files - the table of relative path to size, modification time and
+                hash from the last scan
+            hash_contents - if true, hash the content of new or changed files
+        """
+        files = {}
+        hashed = 0
+        now = time.time()
+        pending = [("", suite_dir)]
+        try:
+            while len(pending) > 0:
+                relative_dir, dir_name = pending.pop()
+                instrumentation.recorder.count("scandir")
+                with os.scandir(dir_name) as entries:
+                    for entry in entries:
+                        relative_name = relative_dir + entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append((relative_name + "/", entry.path))
+                            continue
+                        stat = entry.stat()
+                        digest = None
+                        if hash_contents:
+                            old = old_files.get(relative_name)
+                            if old is not None and old[0] == stat.st_size and old[1] == stat.st_mtime_ns and \
+                                    old[2] is not None:
+                                digest = old[2]
+                            else:
+                                digest = FingerprintIndex.hash_file(entry.path)
+                                hashed += 1
+                        files[relative_name] = [stat.st_size, stat.st_mtime_ns, digest]
+        except OSError as e:
+            message = "Unable to read test suite directory " + suite_dir + " because " + str(e)
+            raise ProjectConfigException(message)
+        hasher = hashlib.sha256()
+        for relative_name in sorted(files):
+            size, mtime, digest = files[relative_name]
+            stamp = digest if hash_contents else str(mtime)
+            hasher.update((relative_name + "\0" + str(size) + "\0" + stamp + "\n").encode("utf-8"))
+            if hash_contents and now - mtime / 1e9 < racy_seconds:
+                # Hash it again next time
+                files[relative_name] = [size, mtime, None]
+        prefix = "content:" if hash_contents else "stat:"
+        return prefix + hasher.hexdigest(), files, hashed
+
+    @staticmethod
+    def hash_file(filename):
+        """Return the SHA-256 digest of the content of a file"""
+        hasher = hashlib.sha256()
+        with open(filename, mode="rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def select_changed(project_config, policy, io_workers=4):
+    """
+    Return the test suites of a configuration to run in a changed-only run, and
+    whether the run is a full run.  Every suite is run if no run has been
+    committed or enough changed-only runs have been committed since the last full
+    run.  The fingerprints are saved as pending.
+
+    Arguments:
+        project_config - a configuration with a single combination
+        policy - the ChangePolicy of the run
+        io_workers - the number of threads that read the suite directories
+    """
+    test_suites = list(project_config.test_suites)
+    suite_root = project_config.root + "/TESTSUITES/" + project_config.product + "/" + \
+        project_config.test_suite_directory
+    index = FingerprintIndex.for_project(project_config)
+    fingerprints = index.fingerprint_all(suite_root, test_suites, policy.hash_contents, io_workers)
+    full = index.baseline is None or index.runs >= policy.full_every
+    selected = test_suites if full else index.changed_suites(test_suites, fingerprints)
+    index.set_pending(fingerprints, full)
+    index.save()
+    return selected, full
+
+
+def commit_baseline(project_config):
+    """
+    Make the pending fingerprints of a configuration the baseline of the next
+    changed-only run.  Return false if no run was pending.
+
+    Argument:
+        project_config - a configuration with a single combination
+    """
+    index = FingerprintIndex.for_project(project_config)
+    committed = index.commit()
+    index.save()
+    return committed
@@ -22,13 +22,15 @@ __version__ = "1.01"
 This module outputs the Jenkins pipeline for the project.
 """
 
+import sys
 from string import Template
+from filecreator import suites_file_name
 
 pipeline_template = """
 pipeline {
     agent {
         node {
-            label "master"
+            label "${label}"
             customWorkspace "${workspace}"
         }
     }
@@ -41,12 +43,62 @@ pipeline {
     }
     post {
         always {
-            junit '*.xml'
+            ${publish}
         }
     }
 }
 """
 
+sharded_pipeline_template = """
+pipeline {
+    agent none
+    stages {
+        stage('${project_name}') {
+            parallel {
+${shard_stages}
+            }
+        }
+    }
+}
+"""
+
+shard_stage_template = """
+                stage('${project_name} shard ${index}') {
+                    agent {
+                        node {
+                            label "${label}"
+                            customWorkspace "${workspace}"
+                        }
+                    }
+                    steps {
+                        bat "${run_file}"
+                    }
+                    post {
+                        always {
+                            ${publish}
+                        }
+                    }
+                }"""
+
+# The templates are compiled once.  The sharded pipeline is split around the list
+# of stages so that the stages can be written one at a time.
+single_pipeline = Template(pipeline_template)
+sharded_pipeline_head, sharded_pipeline_tail = \
+    [Template(part) for part in sharded_pipeline_template.split("${shard_stages}")]
+shard_stage = Template(shard_stage_template)
+
+# The steps that publish the reports.  A changed-only run may run no suites at all,
+# so it must not fail the build when there are no reports.
+junit_step = Template("junit '${pattern}'")
+junit_step_allow_empty = Template("junit testResults: '${pattern}', allowEmptyResults: true")
+
+# Name of the merged report written by the report aggregator in the workspace
+merged_report_name = "gfit-results.xml"
+
+# Indentation of the steps in the post blocks of the pipelines
+single_indent = " " * 12
+shard_indent = " " * 28
+
 # -------------------------------------------------------------------------------
 #  Class description
 # -------------------------------------------------------------------------------
@@ -57,33 +109,149 @@ class PipelineGenerator:
     This class generates the declarative pipeline code for Jenkins for this project.
     """
 
-    def __init__(self, project_config):
+    def __init__(self, project_config, allow_empty_results=False, aggregate_command=None):
         """Initialize the class.
 
-        Argument:
+        Arguments:
             project_config - the project configuration class with the properties
                needed to produce the pipeline.
+            allow_empty_results - if true, the build does not fail when the run
+               produces no reports, as in a changed-only run
+            aggregate_command - the command that merges the reports of the suites
+               into a single report, or None to publish every report
         """
         assert project_config is not None, "Project configuration argument must not be None"
         self._project_config = project_config
+        self._allow_empty_results = allow_empty_results
+        self._aggregate_command = aggregate_command
+        return
+
+    def publish_steps(self, indent, allow_empty_results=None, suites_file=None):
+        """
+        Return the steps of a post block that publish the reports.  If the reports
+        are aggregated, the merged report is written first and is the only report
+        published.
+
+        Arguments:
+            indent - the indentation of the steps after the first
+            allow_empty_results - true if the build must not fail without reports,
+               or None to use the setting of the generator
+            suites_file - the full path of the list of the suites whose reports are
+               merged, or None to merge the reports of all suites
+        """
+        if allow_empty_results is None:
+            allow_empty_results = self._allow_empty_results
+        junit = junit_step_allow_empty if allow_empty_results else junit_step
+        if self._aggregate_command is None:
+            return junit.substitute(pattern="*.xml")
+        command = self._aggregate_command
+        if suites_file is not None:
+            command += " --suites " + suites_file
+        return "bat \"" + command + "\"\n" + indent + junit.substitute(pattern=merged_report_name)
+
+    def output_pipeline(self, workspace_path, run_file, shard_run_files=None, stream=None, rerun_file=None):
+        """
+        Output the pipeline to the console, or to a stream.  The pipeline is written
+        a piece at a time rather than built as one string.
+
+        Arguments:
+            workspace_path - the full path of the workspace
+            run_file - the full path of the .bat file
+            shard_run_files - the full paths of the .bat files of the shards, or None
+                or an empty list if the project is not sharded
+            stream - the text stream to be written, or None for standard output
+            rerun_file - the full path of the .bat file that reruns the failed
+                suites, or None.  If given, the pipeline runs only that file.
+        """
+        if stream is None:
+            stream = sys.stdout
+        for chunk in self.iter_pipeline(workspace_path, run_file, shard_run_files, rerun_file):
+            # Replace backslash with forward slash which can be handled Jenkins.
+            # Jenkins treats the backslash as an escape characters in pipelines.
+            stream.write(chunk.replace("\\", "\\\\"))
+        stream.write("\n")
         return
 
-    def output_pipeline(self, workspace_path, run_file):
+    def iter_pipeline(self, workspace_path, run_file, shard_run_files=None, rerun_file=None):
         """
-        Output the pipeline to the console.
+        Return an iterator over the pieces of the pipeline, before backslashes are
+        escaped.
 
         Arguments:
             workspace_path - the full path of the workspace
             run_file - the full path of the .bat file
+            shard_run_files - the full paths of the .bat files of the shards, or None
+                or an empty list if the project is not sharded
+            rerun_file - the full path of the .bat file that reruns the failed
+                suites, or None
         """
+        if rerun_file is not None:
+            yield from self.iter_rerun_pipeline(workspace_path, rerun_file)
+            return
+        if shard_run_files:
+            yield from self.iter_sharded_pipeline(workspace_path, shard_run_files)
+            return
         subs = {
             "workspace": workspace_path,
-            "project_name": self._project_config.project,
-            "run_file": run_file
+            "label": self._project_config.agent_label,
+            "project_name": self._project_config.workspace_project,
+            "run_file": run_file,
+            "publish": self.publish_steps(single_indent)
         }
-        content = Template(pipeline_template).substitute(subs)
-        # Replace backslash with forward slash which can be handled Jenkins.
-        # Jenkins treats the backslash as an escape characters in pipelines.
-        content = content.replace("\\", "\\\\")
-        print(content)
-        return
+        yield single_pipeline.substitute(subs)
+
+    def iter_rerun_pipeline(self, workspace_path, rerun_file):
+        """
+        Return an iterator over the pieces of a pipeline with a single stage that
+        reruns the failed suites in the workspace of the project.  The reports of
+        the suites that are not run again are left in place, and the build does not
+        fail if no suite is run.
+
+        Arguments:
+            workspace_path - the full path of the workspace
+            rerun_file - the full path of the .bat file that reruns the failed suites
+        """
+        subs = {
+            "workspace": workspace_path,
+            "label": self._project_config.agent_label,
+            "project_name": self._project_config.workspace_project + " rerun",
+            "run_file": rerun_file,
+            "publish": self.publish_steps(single_indent, allow_empty_results=True)
+        }
+        yield single_pipeline.substitute(subs)
+
+    def generate_sharded_pipeline(self, workspace_path, shard_run_files):
+        """
+        Return a pipeline that runs each shard in a parallel stage on its own agent,
+        in its own subfolder of the workspace.
+
+        Arguments:
+            workspace_path - the full path of the workspace
+            shard_run_files - the full paths of the .bat files of the shards
+        """
+        return "".join(self.iter_sharded_pipeline(workspace_path, shard_run_files))
+
+    def iter_sharded_pipeline(self, workspace_path, shard_run_files):
+        """
+        Return an iterator over the pieces of the sharded pipeline.  Each shard
+        merges only the reports of its own suites.
+
+        Arguments:
+            workspace_path - the full path of the workspace
+            shard_run_files - the full paths of the .bat files of the shards
+        """
+        subs = {
+            "project_name": self._project_config.workspace_project,
+            "label": self._project_config.agent_label
+        }
+        yield sharded_pipeline_head.substitute(subs)
+        for index, shard_run_file in enumerate(shard_run_files, start=1):
+            subs["index"] = str(index)
+            subs["workspace"] = workspace_path + "\\shard" + str(index)
+            subs["run_file"] = shard_run_file
+            subs["publish"] = self.publish_steps(shard_indent, suites_file=suites_file_name(shard_run_file))
+            stage = shard_stage.substitute(subs)
+            if index == 1:
+                stage = stage.lstrip("\n")
+            yield stage
+        yield sharded_pipeline_tail.substitute(subs)
@@ -0,0 +1,199 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module records the wall time of each phase of a run and counts file system
+operations.  Other modules report to the module variable recorder, which does
+nothing until enable is called.
+
+    with instrumentation.recorder.phase("validate"):
+        ...
+    instrumentation.recorder.count("stat")
+"""
+
+import json
+import sys
+import threading
+import time
+from contextlib import nullcontext
+
+# Counters reported even when they are zero
+standard_counters = ("stat", "scandir", "dirs_created", "files_written", "bytes_written",
+                     "files_skipped", "files_pruned")
+
+# -------------------------------------------------------------------------------
+#  Recorders
+# -------------------------------------------------------------------------------
+
+
+class NullRecorder:
+    """This class is the recorder used when instrumentation is off.  It does nothing."""
+
+    enabled = False
+
+    _context = nullcontext()
+
+    def phase(self, name):
+        """Return a context manager that does nothing"""
+        return self._context
+
+    def count(self, name, amount=1):
+        """Do nothing"""
+        return
+
+
+class Recorder:
+    """
+    This class accumulates the wall time of named phases and the values of named
+    counters.  It may be used by several threads.
+    """
+
+    enabled = True
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self):
+        """Initialize the class."""
+        self._phases = {}
+        self._counters = dict((name, 0) for name in standard_counters)
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def phase(self, name):
+        """Return a context manager that adds the time spent inside it to a phase.
+
+        Argument:
+            name - the name of the phase
+        """
+        return _PhaseTimer(self, name)
+
+    def add_time(self, name, seconds):
+        """Add time to a phase.
+
+        Arguments:
+            name - the name of the phase
+            seconds - the time to be added
+        """
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+        return
+
+    def count(self, name, amount=1):
+        """Add to a counter.
+
+        Arguments:
+            name - the name of the counter
+            amount - the amount to be added
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+        return
+
+    def report(self):
+        """Return the phases and counters as a dictionary"""
+        with self._lock:
+            return {
+                "total": round(time.perf_counter() - self._start, 6),
+                "phases": dict((name, round(seconds, 6)) for name, seconds in self._phases.items()),
+                "counters": dict(self._counters)
+            }
+
+
+class _PhaseTimer:
+    """This class is the context manager returned by Recorder.phase"""
+
+    def __init__(self, recorder, name):
+        """Initialize the class."""
+        self._recorder = recorder
+        self._name = name
+        self._start = None
+        return
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._recorder.add_time(self._name, time.perf_counter() - self._start)
+        return False
+
+
+# The recorder used by the other modules
+recorder = NullRecorder()
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def enable():
+    """Start recording in this process and return the new recorder"""
+    global recorder
+    recorder = Recorder()
+    return recorder
+
+
+def disable():
+    """Stop recording in this process"""
+    global recorder
+    recorder = NullRecorder()
+    return
+
+
+def write_report(reports, destination):
+    """
+    Write profile reports to standard error or to a JSON file.
+
+    Arguments:
+        reports - a dictionary of project config file name to report
+        destination - "-" for standard error, otherwise the name of the JSON file
+    """
+    if destination == "-":
+        for config, report in reports.items():
+            print_report(config, report, sys.stderr)
+        return
+    with open(destination, mode="w") as file:
+        json.dump(reports, file, indent=2)
+    return
+
+
+def print_report(config, report, stream):
+    """
+    Print one profile report in a readable form.
+
+    Arguments:
+        config - the name of the project config file
+        report - the dictionary produced by Recorder.report
+        stream - the text stream to be written
+    """
+    stream.write("Profile of " + config + " (" + "{0:.4f}s".format(report["total"]) + ")\n")
+    for name, seconds in report["phases"].items():
+        stream.write("    {0:<20} {1:>10.4f}s\n".format(name, seconds))
+    for name, value in report["counters"].items():
+        stream.write("    {0:<20} {1:>10}\n".format(name, value))
+    return
@@ -19,36 +19,72 @@
 __author__ = 'Bill Shaffer'
 __version__ = "1.00"
 
+import argparse
+import contextvars
+import cProfile
+import glob
+import io
+import os
 import sys
+import time
 import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
 from projectconfigexception import ProjectConfigException
 from projectconfig import ProjectConfig
+from configcache import ConfigCache
+from dircache import DirectoryCache
 from pathlib import Path
 from filecreator import BatFileCreator
 from filecreator import PropertyCreator
+from filecreator import OutputManifest
+from filecreator import StagedWriter
+from filecreator import default_write_workers
 from generatepipeline import PipelineGenerator
+from durations import DurationIndex
+import aggregate
+import discovery
+import fingerprints
+import instrumentation
+import reports
 
 """
 This module executes the Project Configuration tool.  This tool creates and checks
 directories and generates the rungfit.bat and property files for the Jenkins project.
 """
 
+# Default number of threads used for file system checks
+default_io_workers = 4
+
+BatchResult = namedtuple("BatchResult", ["filename", "succeeded", "message", "output", "seconds", "profile"],
+                         defaults=(None,))
+
 
 # -------------------------------------------------------------------------------
 #  Main Function
 # -------------------------------------------------------------------------------
 
 
-def main(project_config_filename):
+def main(project_config_filename, profile=None, cprofile=None, **options):
     """
     Run the ProjectConfig program.
 
     Arguments:
         project_config_filename - the XML file with the project configuration
+        profile - "-" to print phase timings and I/O counts to standard error, the
+            name of a JSON file to receive them, or None for no profile
+        cprofile - the name of a file to receive cProfile statistics, or None
+        options - keyword options passed to process
     """
     print("Starting ProjectConfig")
+    recorder = None
+    if profile is not None:
+        recorder = instrumentation.enable()
     try:
-        process(project_config_filename)
+        run_process(project_config_filename, cprofile, **options)
     except ProjectConfigException as e:
         print("Error: " + str(e))
         info = sys.exc_info()
@@ -62,71 +98,501 @@ def main(project_config_filename):
         traceback.print_tb(tb)
         sys.exit(1)
     finally:
+        if recorder is not None:
+            instrumentation.write_report({project_config_filename: recorder.report()}, profile)
         print("Ending ProjectConfig")
     sys.exit(0)
 
 
-def process(project_config_filename):
+def batch_main(config_paths, workers=None, **options):
+    """
+    Run the ProjectConfig program against many project configurations on a pool of
+    worker processes.  A failure in one configuration does not stop the others.
+
+    Arguments:
+        config_paths - project config files, directories holding them, or glob patterns
+        workers - the number of worker processes.  None means one per CPU.
+        options - keyword options passed to process_one
+    """
+    print("Starting ProjectConfig batch")
+    filenames = expand_config_paths(config_paths)
+    if len(filenames) == 0:
+        print("Error: No project config files were found")
+        print("Ending ProjectConfig batch")
+        sys.exit(1)
+    start = time.perf_counter()
+    results = process_batch(filenames, workers, **options)
+    elapsed = time.perf_counter() - start
+    failures = 0
+    for result in results:
+        print(result.output, end="")
+        status = "OK    " if result.succeeded else "FAILED"
+        print(status + " " + result.filename + " (" + format_seconds(result.seconds) + ")")
+        if not result.succeeded:
+            failures += 1
+            print(result.message)
+    print_batch_summary(results, failures, elapsed)
+    if options.get("profile") is not None:
+        profiles = dict((result.filename, result.profile) for result in results if result.profile is not None)
+        instrumentation.write_report(profiles, options["profile"])
+    print("Ending ProjectConfig batch")
+    sys.exit(0 if failures == 0 else 1)
+
+
+def watch_main(config_paths, io_workers=default_io_workers, watch_suites=False, poll_interval=1.0, debounce=0.5):
+    """
+    Generate the projects, then keep regenerating them as their project config files
+    change, until interrupted.
+
+    Arguments:
+        config_paths - project config files, directories holding them, or glob patterns
+        io_workers - the number of threads used for file system checks
+        watch_suites - if true, also watch the test suite directories
+        poll_interval - the seconds between polls
+        debounce - the seconds a change must be stable before it is used
+    """
+    # Imported here because the watcher module imports this one
+    from watcher import ProjectWatcher
+    print("Starting ProjectConfig watch")
+    filenames = expand_config_paths(config_paths)
+    if len(filenames) == 0:
+        print("Error: No project config files were found")
+        print("Ending ProjectConfig watch")
+        sys.exit(1)
+    try:
+        ProjectWatcher(filenames, io_workers, watch_suites).run(poll_interval, debounce)
+    except KeyboardInterrupt:
+        pass
+    print("Ending ProjectConfig watch")
+    sys.exit(0)
+
+
+def commit_main(config_paths):
+    """
+    Make the fingerprints of the last changed-only run of each project the baseline
+    of the next one.  This is run after the tests of the run have passed.
+
+    Argument:
+        config_paths - project config files, directories holding them, or glob patterns
+    """
+    print("Starting ProjectConfig commit")
+    filenames = expand_config_paths(config_paths)
+    if len(filenames) == 0:
+        print("Error: No project config files were found")
+        print("Ending ProjectConfig commit")
+        sys.exit(1)
+    try:
+        for filename in filenames:
+            for combination in load_project_config(filename).expand():
+                project_dir = BatFileCreator(combination).project_dir
+                if fingerprints.commit_baseline(combination):
+                    print("Committed the test suite baseline of " + project_dir)
+                else:
+                    print("No changed-only run is pending for " + project_dir)
+    except ProjectConfigException as e:
+        print("Error: " + str(e))
+        print("Ending ProjectConfig commit")
+        sys.exit(1)
+    print("Ending ProjectConfig commit")
+    sys.exit(0)
+
+
+def process_batch(filenames, workers=None, **options):
+    """
+    Process each project config file on a process pool and return a list of
+    BatchResult in the order of the filenames.
+
+    Arguments:
+        filenames - the project config files
+        workers - the number of worker processes.  None means one per CPU.
+        options - keyword options passed to process_one
+    """
+    assert workers is None or workers > 0, "Number of workers must be positive"
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(filenames))
+    task = partial(process_one, **options)
+    if workers <= 1:
+        return [task(filename) for filename in filenames]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(task, filenames))
+    return results
+
+
+def process_one(project_config_filename, profile=None, cprofile=None, **options):
+    """
+    Process one project config file, capturing its console output.  Errors are
+    reported in the result rather than raised, so one bad file does not end a batch.
+
+    Arguments:
+        project_config_filename - the XML file with the project configuration
+        profile - if not None, the phase timings and I/O counts are returned in
+            the result
+        cprofile - a file name for cProfile statistics, or None.  The name of the
+            project config file is added to it, so each configuration has its own.
+        options - keyword options passed to process
+    """
+    buffer = io.StringIO()
+    succeeded = False
+    message = ""
+    recorder = None
+    if profile is not None:
+        recorder = instrumentation.enable()
+    if cprofile is not None:
+        base, extension = os.path.splitext(cprofile)
+        stem = os.path.splitext(os.path.basename(project_config_filename))[0]
+        cprofile = base + "-" + stem + extension
+    start = time.perf_counter()
+    try:
+        with redirect_stdout(buffer):
+            run_process(project_config_filename, cprofile, **options)
+        succeeded = True
+    except ProjectConfigException as e:
+        message = "Error: " + str(e)
+    except Exception as e:
+        message = "Exception: " + str(e) + "\n" + traceback.format_exc()
+    seconds = time.perf_counter() - start
+    report_data = None
+    if recorder is not None:
+        report_data = recorder.report()
+        instrumentation.disable()
+    return BatchResult(project_config_filename, succeeded, message, buffer.getvalue(), seconds, report_data)
+
+
+def expand_config_paths(config_paths):
+    """
+    Return the list of project config files named by the arguments.  A directory
+    contributes every .xml file in it, and a glob pattern contributes its matches.
+
+    Arguments:
+        config_paths - a list of file names, directory names or glob patterns
+    """
+    filenames = []
+    for config_path in config_paths:
+        if os.path.isdir(config_path):
+            matches = sorted(glob.glob(os.path.join(config_path, "*.xml")))
+        elif glob.has_magic(config_path):
+            matches = sorted(glob.glob(config_path))
+        else:
+            matches = [config_path]
+        for match in matches:
+            if match not in filenames:
+                filenames.append(match)
+    return filenames
+
+
+def print_batch_summary(results, failures, elapsed):
+    """
+    Print the totals and timings for a batch run.
+
+    Arguments:
+        results - the list of BatchResult
+        failures - the number of configurations that failed
+        elapsed - the wall clock time of the batch in seconds
+    """
+    total = sum(result.seconds for result in results)
+    slowest = max(results, key=lambda result: result.seconds)
+    print("")
+    print("Batch summary")
+    print("    Configurations: " + str(len(results)))
+    print("    Succeeded:      " + str(len(results) - failures))
+    print("    Failed:         " + str(failures))
+    print("    Wall time:      " + format_seconds(elapsed))
+    print("    Total time:     " + format_seconds(total))
+    print("    Slowest:        " + slowest.filename + " (" + format_seconds(slowest.seconds) + ")")
+    return
+
+
+def format_seconds(seconds):
+    """Return a duration in seconds formatted for the console"""
+    return "{0:.2f}s".format(seconds)
+
+
+def run_process(project_config_filename, cprofile=None, **options):
+    """
+    Process the project configuration, under cProfile if a statistics file is given.
+
+    Arguments:
+        project_config_filename - the XML file with the project configuration
+        cprofile - the name of a file to receive cProfile statistics, or None
+        options - keyword options passed to process
+    """
+    if cprofile is None:
+        process(project_config_filename, **options)
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(process, project_config_filename, **options)
+    finally:
+        profiler.dump_stats(cprofile)
+    return
+
+
+def process(project_config_filename, cache_dir=None, streaming=False, io_workers=default_io_workers,
+            write_workers=default_write_workers, changes=None, rerun_failed=False, aggregate_reports=False):
     """
     Process the project configuration specification.
 
     Arguments:
         project_config_filename - the XML file with the project configuration
+        cache_dir - the directory of the parsed configuration cache, or None to
+            parse the XML file every time
+        streaming - if true, stream the test suites from the XML file rather than
+            holding them in memory
+        io_workers - the number of threads used for file system checks
+        write_workers - the most files written at the same time
+        changes - a ChangePolicy to run only the test suites that changed, or None
+            to run all of them
+        rerun_failed - if true, also generate a batch file and a pipeline that run
+            only the test suites that failed in the last run
+        aggregate_reports - if true, the pipeline merges the reports and publishes
+            only the merged report
     """
-    project_config = ProjectConfig(project_config_filename)
-    project_config.parse()
-    validate_root(project_config.root)
-    workspace_path = validate_workspace(project_config.workspace,
-                                        project_config.environment,
-                                        project_config.project)
-    run_file = validate_exec_dir(project_config.root,
-                      project_config.environment,
-                      project_config.product,
-                      project_config.project)
-    validate_test_suites(project_config.root,
-                         project_config.product,
-                         project_config.test_suite_directory,
-                         project_config.test_suites)
-    bat_creator = BatFileCreator(project_config)
-    bat_creator.create_rungfit()
-    properties_creator = PropertyCreator(project_config)
-    properties_creator.create_properties_files()
-    pipeline_generator = PipelineGenerator(project_config)
-    pipeline_generator.output_pipeline(workspace_path, run_file)
+    with instrumentation.recorder.phase("load_config"):
+        project_config = load_project_config(project_config_filename, cache_dir, streaming)
+    generate_all(project_config, DirectoryCache(), io_workers, write_workers, changes, rerun_failed,
+                 aggregate_reports)
+    return
+
+
+def generate_all(project_config, dir_cache, io_workers=default_io_workers, write_workers=default_write_workers,
+                 changes=None, rerun_failed=False, aggregate_reports=False):
+    """
+    Generate the files of every combination of a matrix configuration, or of the
+    single configuration.  The combinations share the parsed file and the directory
+    cache.  A failed combination does not stop the others.
+
+    Arguments:
+        project_config - the parsed project configuration
+        dir_cache - the DirectoryCache used for the directory checks
+        io_workers - the number of threads used for file system checks
+        write_workers - the most files written at the same time
+        changes - a ChangePolicy to run only the test suites that changed, or None
+        rerun_failed - if true, also generate the files that rerun failed suites
+        aggregate_reports - if true, the pipeline publishes only a merged report
+    """
+    combinations = project_config.expand()
+    if len(combinations) == 1:
+        generate(combinations[0], dir_cache, io_workers, write_workers, changes, rerun_failed, aggregate_reports)
+        return
+    failures = 0
+    for combination in combinations:
+        report("Combination " + combination.environment + " " + combination.product + " " + combination.server)
+        try:
+            generate(combination, dir_cache, io_workers, write_workers, changes, rerun_failed, aggregate_reports)
+        except ProjectConfigException as e:
+            failures += 1
+            report("Error: " + str(e))
+    if failures > 0:
+        message = str(failures) + " of " + str(len(combinations)) + " combinations failed"
+        raise ProjectConfigException(message)
     return
 
 
-def validate_root(root_dir):
+def generate(project_config, dir_cache, io_workers=default_io_workers, write_workers=default_write_workers,
+             changes=None, rerun_failed=False, aggregate_reports=False):
+    """
+    Check the directories of a parsed project configuration and generate its files.
+    The changed files are staged and replaced together when the manifest is saved.
+    In a changed-only run, the batch files run only the test suites that changed
+    since the last committed run.  When failed suites are rerun, the reports of the
+    last run are read, rungfit-rerun.bat runs the suites that failed or left no
+    report, and the pipeline runs only that file.
+
+    Arguments:
+        project_config - the parsed project configuration
+        dir_cache - the DirectoryCache used for the directory checks
+        io_workers - the number of threads used for file system checks
+        write_workers - the most files written at the same time
+        changes - a ChangePolicy to run only the test suites that changed, or None
+        rerun_failed - if true, also generate the files that rerun failed suites
+        aggregate_reports - if true, the pipeline publishes only a merged report
+    """
+    recorder = instrumentation.recorder
+    with recorder.phase("validate"):
+        workspace_path, run_file = validate_all(project_config, dir_cache, io_workers)
+    if project_config.discovery is not None:
+        with recorder.phase("discovery"):
+            test_suites = discovery.discover(project_config)
+        report("Discovered " + str(len(test_suites)) + " test suites")
+    selected = None
+    if changes is not None:
+        with recorder.phase("fingerprints"):
+            selected, full = fingerprints.select_changed(project_config, changes, io_workers)
+        if full:
+            report("Full run of " + str(len(selected)) + " test suites")
+        else:
+            report("Changed-only run of " + str(len(selected)) + " changed test suites")
+    rerun_suites = None
+    if rerun_failed:
+        with recorder.phase("reports"):
+            creator = BatFileCreator(project_config)
+            failed, unreported = reports.find_failed_suites(creator.test_suites, creator.reports_dir, io_workers)
+        report("Failed test suites: " + str(len(failed)) + ", without reports: " + str(len(unreported)))
+        rerun = set(failed) | set(unreported)
+        rerun_suites = [test_suite for test_suite in creator.test_suites if test_suite in rerun]
+    with recorder.phase("manifest"):
+        manifest = OutputManifest.for_project(project_config, StagedWriter(write_workers))
+    # The durations balance shards and parallel runs and set the suite timeouts
+    with recorder.phase("durations"):
+        durations = load_durations(project_config, io_workers)
+    with recorder.phase("bat_files"):
+        bat_creator = BatFileCreator(project_config, manifest, durations)
+        if selected is not None:
+            bat_creator.select(selected)
+        bat_creator.create_rungfit()
+        if rerun_suites is not None:
+            bat_creator.create_rerun(rerun_suites)
+        shard_run_files = bat_creator.create_shards()
+    with recorder.phase("properties_files"):
+        properties_creator = PropertyCreator(project_config, manifest, durations)
+        if selected is not None:
+            properties_creator.select(selected)
+        properties_creator.create_properties_files()
+    with recorder.phase("commit"):
+        manifest.save()
+    print("Files written: " + str(manifest.written) + ", skipped: " + str(manifest.skipped) +
+          ", pruned: " + str(manifest.pruned))
+    with recorder.phase("pipeline"):
+        aggregate_command = aggregate.pipeline_command(project_config) if aggregate_reports else None
+        pipeline_generator = PipelineGenerator(project_config, changes is not None, aggregate_command)
+        rerun_file = bat_creator.rerun_file_name if rerun_suites is not None else None
+        pipeline_generator.output_pipeline(workspace_path, run_file, shard_run_files, rerun_file=rerun_file)
+    return
+
+
+def load_project_config(project_config_filename, cache_dir=None, streaming=False):
+    """
+    Return the parsed project configuration, using the cache if one is given.  A
+    streaming configuration is never cached, since the cache holds every test suite.
+
+    Arguments:
+        project_config_filename - the XML file with the project configuration
+        cache_dir - the directory of the parsed configuration cache, or None
+        streaming - if true, stream the test suites from the XML file
+    """
+    if cache_dir is not None and not streaming:
+        return ConfigCache(cache_dir).load(project_config_filename)
+    project_config = ProjectConfig(project_config_filename, streaming)
+    project_config.parse()
+    return project_config
+
+
+def load_durations(project_config, io_workers=default_io_workers):
+    """
+    Return the duration index of the project, updated from the latest reports.
+
+    Arguments:
+        project_config - the parsed project configuration
+        io_workers - the number of threads that read reports
+    """
+    durations = DurationIndex.for_project(project_config)
+    durations.refresh(project_config, io_workers)
+    durations.save()
+    return durations
+
+
+def validate_all(project_config, dir_cache=None, io_workers=default_io_workers):
+    """
+    Check the exec root, the workspace tree and the test suite tree concurrently,
+    creating the project directories that are missing.  All of the problems found
+    are reported in a single exception.  The directories of discovered test suites
+    are not checked, since discovery finds only existing directories.
+
+    Arguments:
+        project_config - the parsed project configuration
+        dir_cache - a DirectoryCache shared by the checks, or None
+        io_workers - the number of threads used for the checks
+
+    Returns:
+        The workspace path and the path of the rungfit.bat file.
+    """
+    assert io_workers > 0, "Number of I/O workers must be positive"
+    test_suites = []
+    if project_config.discovery is None:
+        test_suites = project_config.test_suites
+    with ThreadPoolExecutor(max_workers=io_workers) as executor:
+        futures = [
+            submit(executor, validate_root, project_config.root, dir_cache),
+            submit(executor, validate_workspace,
+                   project_config.workspace,
+                   project_config.environment,
+                   project_config.workspace_project,
+                   dir_cache),
+            submit(executor, validate_exec_dir,
+                   project_config.root,
+                   project_config.environment,
+                   project_config.product,
+                   project_config.project,
+                   dir_cache),
+            submit(executor, validate_test_suites,
+                   project_config.root,
+                   project_config.product,
+                   project_config.test_suite_directory,
+                   test_suites,
+                   dir_cache)
+        ]
+    messages = []
+    for future in futures:
+        error = future.exception()
+        if error is None:
+            continue
+        if not isinstance(error, ProjectConfigException):
+            raise error
+        if str(error) not in messages:
+            messages.append(str(error))
+    if len(messages) == 1:
+        raise ProjectConfigException(messages[0])
+    if len(messages) > 1:
+        message = str(len(messages)) + " problems were found:\n    " + "\n    ".join(messages)
+        raise ProjectConfigException(message)
+    return futures[1].result(), futures[2].result()
+
+
+def submit(executor, function, *args):
+    """
+    Submit a call to an executor, run in a copy of the current context so that
+    context variables, such as the output capture of the server, follow the call.
+
+    Arguments:
+        executor - the executor that runs the call
+        function - the function to be called
+        args - the arguments of the function
+    """
+    return executor.submit(contextvars.copy_context().run, function, *args)
+
+
+def validate_root(root_dir, dir_cache=None):
     """Check that the root directory exists.  If not, throw an exception"""
-    if not is_dir(root_dir):
+    if not is_dir(root_dir, dir_cache):
         message = "Root directory does not exist - " + root_dir
         raise ProjectConfigException(message)
     return
 
 
-def validate_workspace(workspace, environment, project):
+def validate_workspace(workspace, environment, project, dir_cache=None):
     """
     Check that the components of the workspace are present.
     Return the full path of the workspece
 
     """
-    if not is_dir(workspace):
+    if not is_dir(workspace, dir_cache):
         message = "Workspace directory does not exist - " + workspace
         raise ProjectConfigException(message)
     environ_path = workspace + "/" + environment
-    if not is_dir(environ_path):
+    if not is_dir(environ_path, dir_cache):
         message = "Environment directory in workspace does not exist - " + environ_path
         raise ProjectConfigException(message)
     project_path = environ_path + "/" + project
-    if not is_dir(project_path):
-        print("Creating workspace project directory " + project_path)
-        create_dir(project_path)
+    if not is_dir(project_path, dir_cache):
+        report("Creating workspace project directory " + project_path)
+        create_dir(project_path, dir_cache)
     project_path = project_path.replace("/", "\\")
-    print("Jenkins workspace is: " + project_path)
+    report("Jenkins workspace is: " + project_path)
     return project_path
 
 
-def validate_exec_dir(root, environment, product, project):
+def validate_exec_dir(root, environment, product, project, dir_cache=None):
     """Check that the exec directory is present.  If the final project directory is not
     present, create it.
 
@@ -135,82 +601,110 @@ def validate_exec_dir(root, environment, product, project):
         environment - the environment: DEV, QA, etc.
         product - the abbreviation for the Guidewire product, for example BC
         project - the name of the Jenkins project
+        dir_cache - a DirectoryCache to answer the checks, or None
 
     """
-    if not is_dir(root):
+    if not is_dir(root, dir_cache):
         message = "Root directory does not exist - " + root
         raise ProjectConfigException(message)
     environ_path = root + "/" + environment
-    if not is_dir(environ_path):
+    if not is_dir(environ_path, dir_cache):
         message = "Environment directory does not exist - " + environ_path
         raise ProjectConfigException(message)
     product_path = environ_path + "/" + product
-    if not is_dir(product_path):
+    if not is_dir(product_path, dir_cache):
         message = "Product directory does not exist - " + product_path
         raise ProjectConfigException(message)
     project_path = product_path + "/" + project
-    if not is_dir(project_path):
-        print("Creating project directory - " + project_path)
-        create_dir(project_path)
+    if not is_dir(project_path, dir_cache):
+        report("Creating project directory - " + project_path)
+        create_dir(project_path, dir_cache)
     batch_command = project_path + "/rungfit.bat"
     batch_command = batch_command.replace("/", "\\")
-    print("Jenkins batch command is: " + batch_command)
+    report("Jenkins batch command is: " + batch_command)
     return batch_command
 
 
-def validate_test_suites(root, product, test_suite_dir, test_suites):
-    """Check that the directories holding the test suites exist.
+def validate_test_suites(root, product, test_suite_dir, test_suites, dir_cache=None):
+    """Check that the directories holding the test suites exist.  Every missing suite
+    directory is reported in a single exception.
 
     Arguments:
         root - the root exec directory
         product - the Guidewire product abbreviation, for example BC
         test_suite_dir - the name of the directory that holds the test suites
         test_suites - a list of test suites
+        dir_cache - a DirectoryCache to answer the checks, or None
     """
     test_suite_root = root + "/TESTSUITES"
-    if not is_dir(test_suite_root):
+    if not is_dir(test_suite_root, dir_cache):
         message = "Test suite root  directory does not exist - " + test_suite_root
         raise ProjectConfigException(message)
     test_suite_product_dir = test_suite_root + "/" + product
-    if not is_dir(test_suite_product_dir):
+    if not is_dir(test_suite_product_dir, dir_cache):
         message = "Test suite root  directory does not exist - " + test_suite_product_dir
         raise ProjectConfigException(message)
     test_suite_project_dir = test_suite_product_dir + "/" + test_suite_dir
-    if not is_dir(test_suite_project_dir):
+    if not is_dir(test_suite_project_dir, dir_cache):
         message = "Test suite root  directory does not exist - " + test_suite_project_dir
         raise ProjectConfigException(message)
+    missing = []
     for test_suite in test_suites:
         suite_dir = test_suite_project_dir + "/" + test_suite
-        if not is_dir(suite_dir):
-            message = "Suite directory does not exist - " + suite_dir
-            raise ProjectConfigException(message)
+        if not is_dir(suite_dir, dir_cache):
+            missing.append(suite_dir)
+    if len(missing) == 1:
+        message = "Suite directory does not exist - " + missing[0]
+        raise ProjectConfigException(message)
+    if len(missing) > 1:
+        message = str(len(missing)) + " suite directories do not exist - " + ", ".join(missing)
+        raise ProjectConfigException(message)
+    return
+
+
+def report(message):
+    """Print a message as a single write, so that lines from the validation threads
+    are not interleaved.
+
+    Arguments:
+        message - the line to be printed
+    """
+    sys.stdout.write(message + "\n")
     return
 
 
-def is_dir(dir_name):
+def is_dir(dir_name, dir_cache=None):
     """Return true if dir is an existing directory.
 
     Arguments:
         dir_name - the name of a directory
+        dir_cache - a DirectoryCache to answer the check, or None to ask the file system
     """
     assert dir_name is not None, "Directory name must not be None"
     assert len(dir_name) > 0, "Directory name must not be an empty "
+    if dir_cache is not None:
+        return dir_cache.is_dir(dir_name)
+    instrumentation.recorder.count("stat")
     adir = Path(dir_name)
     return adir.is_dir()
 
 
-def create_dir(dir_name):
+def create_dir(dir_name, dir_cache=None):
     """
     Create the directory with the name dir_name
 
     Arguments:
         dir_name - name of the directory
+        dir_cache - a DirectoryCache to be told about the new directory, or None
     """
     assert dir_name is not None, "Directory name must not be None"
     assert len(dir_name) > 0, "Directory name must not be an empty string"
     if not is_dir(dir_name):
         Path(dir_name).mkdir()
+        instrumentation.recorder.count("dirs_created")
     assert is_dir(dir_name), "Directory was not created - " + dir_name
+    if dir_cache is not None:
+        dir_cache.add(dir_name)
     return
 
 
@@ -219,13 +713,90 @@ def create_dir(dir_name):
 # ---------------------------------------------------------------------------
 
 
+def parse_arguments(argv):
+    """
+    Return the parsed command line arguments.
+
+    Arguments:
+        argv - the command line arguments without the program name
+    """
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Create the directories, rungfit.bat and property files for Jenkins projects.")
+    parser.add_argument("configs", nargs="+", metavar="project_config",
+                        help="a project config file, a directory of them, or a glob pattern")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes in batch mode (default: one per CPU)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory for cached snapshots of parsed project configs")
+    parser.add_argument("--streaming", action="store_true",
+                        help="stream the test suites from the XML file for very large suite lists "
+                             "(the config cache is not used)")
+    parser.add_argument("--io-workers", type=int, default=default_io_workers,
+                        help="number of threads for file system checks (default: " +
+                             str(default_io_workers) + ")")
+    parser.add_argument("--write-workers", type=int, default=default_write_workers,
+                        help="most generated files written at the same time (default: %(default)s)")
+    parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="FILE",
+                        help="report phase timings and I/O counts on standard error, or as JSON "
+                             "in FILE")
+    parser.add_argument("--cprofile", default=None, metavar="FILE",
+                        help="write cProfile statistics to FILE (one file per config in batch mode)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and regenerate projects when their config files change")
+    parser.add_argument("--watch-suites", action="store_true",
+                        help="in watch mode, also check the test suites when their directory changes")
+    parser.add_argument("--poll-interval", type=float, default=1.0,
+                        help="seconds between checks for changes in watch mode (default: %(default)s)")
+    parser.add_argument("--debounce", type=float, default=0.5,
+                        help="seconds a change must be stable before it is used in watch mode "
+                             "(default: %(default)s)")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="run only the test suites whose files changed since the last committed run")
+    parser.add_argument("--full-every", type=int, default=fingerprints.default_full_every,
+                        help="with --changed-only, run every suite after this many committed runs "
+                             "(default: %(default)s)")
+    parser.add_argument("--hash-contents", action="store_true",
+                        help="with --changed-only, compare the content of files rather than their "
+                             "modification times")
+    parser.add_argument("--rerun-failed", action="store_true",
+                        help="also generate rungfit-rerun.bat and a pipeline that run only the suites that "
+                             "failed in the last run")
+    parser.add_argument("--aggregate-reports", action="store_true",
+                        help="generate a pipeline that merges the reports with aggregate.py and publishes "
+                             "only the merged report")
+    parser.add_argument("--commit-baseline", action="store_true",
+                        help="record the last changed-only run as passed, so its suites are not run again")
+    return parser.parse_args(argv)
+
+
+def is_batch(args):
+    """Return true if the arguments call for batch mode rather than a single project"""
+    if len(args.configs) != 1 or args.workers is not None:
+        return True
+    config = args.configs[0]
+    return os.path.isdir(config) or glob.has_magic(config)
+
+
 if __name__ == '__main__':
     """Run the ProjectConfig program"""
-    if len(sys.argv) != 2:
-        print("""
-              To execute ProjectConfig, use this command:
-
-              python main.py project_config_filename 
-              """)
-        sys.exit(1)
-    main(sys.argv[1])
+    arguments = parse_arguments(sys.argv[1:])
+    process_options = {"cache_dir": arguments.cache_dir,
+                       "streaming": arguments.streaming,
+                       "io_workers": arguments.io_workers,
+                       "write_workers": arguments.write_workers,
+                       "profile": arguments.profile,
+                       "cprofile": arguments.cprofile,
+                       "changes": None,
+                       "rerun_failed": arguments.rerun_failed,
+                       "aggregate_reports": arguments.aggregate_reports}
+    if arguments.changed_only:
+        process_options["changes"] = fingerprints.ChangePolicy(arguments.full_every, arguments.hash_contents)
+    if arguments.commit_baseline:
+        commit_main(arguments.configs)
+    if arguments.watch:
+        watch_main(arguments.configs, arguments.io_workers, arguments.watch_suites, arguments.poll_interval,
+                   arguments.debounce)
+    if is_batch(arguments):
+        batch_main(arguments.configs, arguments.workers, **process_options)
+    main(arguments.configs[0], **process_options)
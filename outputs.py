@@ -0,0 +1,194 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module lets other programs use the Project Configuration tool as a library.
+The render function returns every file of a project as a dictionary of path to
+content without checking directories, writing files, printing or exiting.  A sink
+then writes the outputs:
+
+    outputs = render(project_config)
+    manifest = OutputManifest.for_project(project_config)
+    materialize(outputs, manifest)
+    manifest.save()
+
+A sink is any object with the write_stream and prune methods of OutputManifest.
+"""
+
+import io
+from filecreator import BatFileCreator
+from filecreator import FileCreator
+from filecreator import PropertyCreator
+from generatepipeline import PipelineGenerator
+
+# Name of the pipeline in the outputs, in the project directory
+pipeline_name = "Jenkinsfile"
+
+# -------------------------------------------------------------------------------
+#  Sinks
+# -------------------------------------------------------------------------------
+
+
+class MemorySink:
+    """This class is a sink that keeps the content of each file in a dictionary"""
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self):
+        """Initialize the class."""
+        self._outputs = {}
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def outputs(self):
+        """Return the dictionary of file name to content"""
+        return self._outputs
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def write_stream(self, filename, generate):
+        """Keep the content made of the chunks produced by a generator function.
+
+        Arguments:
+            filename - the full path name of the file
+            generate - a function without arguments that returns an iterator over
+                the chunks of the content
+        """
+        self._outputs[filename] = "".join(generate())
+        return True
+
+    def prune(self, keep, suffix):
+        """Do nothing, since only the files generated are kept"""
+        return
+
+
+class DiskSink:
+    """This class is a sink that writes every file, whether or not it has changed"""
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self):
+        """Initialize the class."""
+        self._written = 0
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def written(self):
+        """Return the number of files written"""
+        return self._written
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def write_stream(self, filename, generate):
+        """Write the chunks produced by a generator function to a file.
+
+        Arguments:
+            filename - the full path name of the file
+            generate - a function without arguments that returns an iterator over
+                the chunks of the content
+        """
+        FileCreator.write_chunks(filename, generate())
+        self._written += 1
+        return True
+
+    def prune(self, keep, suffix):
+        """Do nothing, since the sink does not know which files it wrote before"""
+        return
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def render(project_config, durations=None):
+    """
+    Return a dictionary of full path name to content for every file of a project:
+    the batch files, the properties files and the pipeline.  The files of every
+    combination of a matrix configuration are included.  Nothing is read from or
+    written to disk apart from the project config file itself, so the test suites
+    of a configuration with a DiscoverSuites element must be found first with
+    discovery.discover.
+
+    Arguments:
+        project_config - the parsed project configuration
+        durations - a DurationIndex used to balance shards and parallel runs and to
+            set the suite timeouts, or None
+    """
+    sink = MemorySink()
+    for combination in project_config.expand():
+        render_combination(combination, sink, durations)
+    return sink.outputs
+
+
+def render_combination(project_config, sink, durations=None):
+    """
+    Pass every file of a single configuration to a sink.
+
+    Arguments:
+        project_config - a configuration with a single combination
+        sink - the sink that receives the files
+        durations - a DurationIndex used to balance shards and parallel runs and to
+            set the suite timeouts, or None
+    """
+    bat_creator = BatFileCreator(project_config, sink, durations)
+    bat_creator.create_rungfit()
+    shard_run_files = bat_creator.create_shards()
+    PropertyCreator(project_config, sink, durations).create_properties_files()
+    plan = bat_creator.plan
+    stream = io.StringIO()
+    PipelineGenerator(project_config).output_pipeline(plan.workspace_path, plan.run_file, shard_run_files,
+                                                      stream)
+    sink.write_stream(pipeline_filename(project_config), lambda: [stream.getvalue()])
+    return
+
+
+def pipeline_filename(project_config):
+    """Return the full path name of the pipeline of a project in the outputs"""
+    return FileCreator(project_config).project_dir + "\\" + pipeline_name
+
+
+def materialize(outputs, sink):
+    """
+    Pass every output to a sink.
+
+    Arguments:
+        outputs - a dictionary of full path name to content
+        sink - an OutputManifest, a DiskSink or another sink
+    """
+    for filename, content in outputs.items():
+        sink.write_stream(filename, lambda text=content: [text])
+    return
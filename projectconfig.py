@@ -18,6 +18,8 @@
 __author__ = 'Bill Shaffer'
 __version__ = "1.01"
 
+import os
+import threading
 from projectconfigexception import ProjectConfigException
 import xml.etree.ElementTree as Et
 from pathlib import Path
@@ -25,8 +27,47 @@ from pathlib import Path
 """
 This module contains the ProjectConfig class that provides an interface to the
 project config XML file.
+
+A matrix configuration lists several Environment and Product elements and is
+expanded into one configuration for each environment and product.  When several
+products are listed, the workspace directory and the pipeline stages of each
+combination are named after the project and the product, for example MyProject-PC,
+so that the combinations do not share a workspace or reports.  A Server element
+may carry environment and product attributes to apply only to those combinations;
+each combination uses the most specific server that matches it.
+
+A configuration may name a base configuration in the extends attribute of its
+TestConfiguration element, relative to its own directory.  Every element of the
+base whose tag does not appear in the configuration is inherited, so a base can
+hold Root, Workspace and Server for many projects.  Bases may extend other bases.
+Each base is parsed once per process and reused while its file is unchanged.  In
+streaming mode the test suites are always read from the configuration itself.
+
+Instead of listing TestSuites, a configuration may contain a DiscoverSuites element
+with Include and Exclude patterns.  The test suites are then the matching
+subdirectories of the test suite directory, found by the discovery module and set
+with set_discovered_suites before the files are generated.
+
+The timeout of each test suite is computed from its recorded durations, within the
+limits of an optional SuiteTimeouts element:
+
+    <SuiteTimeouts factor="3" floor="600" ceiling="9600"/>
+
+A TestSuite element may give its own timeout in seconds in a timeout attribute.
 """
 
+# Marks a field that has not been read from the file
+_unread = object()
+
+# The factor applied to the recorded durations of a suite, and the shortest and
+# longest timeouts in seconds, when the SuiteTimeouts element does not give them
+default_timeout_policy = (3.0, 600, 9600)
+
+# Parsed base configurations of this process, by normalized file name.  Each entry
+# is a tuple of the file stamps the base depends on and its merged element.
+_base_cache = {}
+_base_lock = threading.Lock()
+
 
 # -------------------------------------------------------------------------------
 #  Class description
@@ -37,19 +78,36 @@ class ProjectConfig:
     other classes.
     """
 
+    # The properties saved in a snapshot of the configuration
+    snapshot_fields = ("root", "workspace", "project", "environment", "product",
+                       "test_suites", "test_suite_directory", "server", "suites_per_jvm",
+                       "parallelism", "shards", "agent_label", "matrix", "discovery", "timeouts",
+                       "timeout_policy")
+
+    # The fields that differ between the combinations of a matrix configuration
+    matrix_fields = ("environment", "product", "server", "matrix")
+
+    # The valid product abbreviations
+    products = ["PC", "BC", "CC"]
+
     # ---------------------------------------------------------------------------
     #  Constructor
     # ---------------------------------------------------------------------------
 
-    def __init__(self, project_config_filename):
+    def __init__(self, project_config_filename, streaming=False):
         """Initialize the class.
 
         Argument:
             project_config_filename -  the full path to the project config file.
+            streaming - if true, the file is parsed incrementally and the test suites
+                are read from the file each time they are iterated, so that memory
+                does not grow with the number of test suites.
         """
         assert project_config_filename is not None, "Project config filename must not be null"
         assert len(project_config_filename) > 0, "Project config filename must not be empty"
         self._filename = project_config_filename
+        self._streaming = streaming
+        self._test_suite_count = None
         self._configuration = None
         self._root = None
         self._workspace = None
@@ -57,7 +115,18 @@ class ProjectConfig:
         self._environment = None
         self._product = None
         self._test_suites = None
+        self._test_suite_directory = None
         self._server = None
+        self._suites_per_jvm = None
+        self._parallelism = None
+        self._shards = None
+        self._agent_label = None
+        self._matrix = None
+        self._workspace_project = None
+        self._discovery = _unread
+        self._timeouts = None
+        self._timeout_policy = None
+        self._dependencies = []
         return
 
     # ---------------------------------------------------------------------------
@@ -93,6 +162,15 @@ class ProjectConfig:
             self._project = ProjectConfig.fetch_text(self.configuration, "Project")
         return self._project
 
+    @property
+    def workspace_project(self):
+        """Return the name of the project directory in the workspace, which is also
+        the name of the pipeline stages: the project name, followed by the product
+        for a combination of a matrix that lists several products."""
+        if self._workspace_project is None:
+            self._workspace_project = self.project
+        return self._workspace_project
+
     @property
     def environment(self):
         """Return the name of the environment"""
@@ -105,14 +183,24 @@ class ProjectConfig:
         """Return the abbreviation for the Guidewire product (PC, BC, CC)"""
         if self._product is None:
             self._product = ProjectConfig.fetch_text(self.configuration, "Product")
-            if self._product not in ["PC", "BC", "CC"]:
-                message = "Invalid product abbreviation - " + self._product
-                raise ProjectConfigException(message)
+            ProjectConfig.check_product(self._product)
         return self._product
 
     @property
     def test_suites(self):
-        """Return a list of the test suites for a project"""
+        """Return a list of the test suites for a project.  In streaming mode, return
+        a new iterator over the test suites instead."""
+        if self.discovery is not None:
+            if self._test_suites is None:
+                message = "Test suites have not been discovered"
+                raise ProjectConfigException(message)
+            return self._test_suites
+        if self._streaming:
+            ProjectConfig.fetch_element(self.configuration, "TestSuites")
+            if self._test_suite_count == 0:
+                message = "No test suites were found"
+                raise ProjectConfigException(message)
+            return self.iter_test_suites()
         if self._test_suites is None:
             test_suite_root = ProjectConfig.fetch_element(self.configuration, "TestSuites")
             test_suite_elements = ProjectConfig.fetch_all_elements(test_suite_root, "TestSuite")
@@ -130,20 +218,167 @@ class ProjectConfig:
         Return the name of the directory that contains the test suites.  This directory usually has the same name
         as the Jenkins project name, but in some cases it will be different
         """
-        suite_name = self.project
-        if ProjectConfig.has_element(self.configuration, "SuiteDirectory"):
-            suite_name = ProjectConfig.fetch_text(self.configuration, "SuiteDirectory")
-        return suite_name
+        if self._test_suite_directory is None:
+            suite_name = self.project
+            if ProjectConfig.has_element(self.configuration, "SuiteDirectory"):
+                suite_name = ProjectConfig.fetch_text(self.configuration, "SuiteDirectory")
+            self._test_suite_directory = suite_name
+        return self._test_suite_directory
 
     @property
     def server(self):
         """
-        Return the name of the server where the application is running
+        Return the name of the server where the application is running.  If a Server
+        element has environment or product attributes, the server is the one that
+        best matches the environment and product of the configuration.
         """
         if self._server is None:
-            self._server = ProjectConfig.fetch_text(self.configuration, "Server")
+            servers = ProjectConfig.fetch_all_elements(self.configuration, "Server")
+            if any(len(server.attrib) > 0 for server in servers):
+                self._server = ProjectConfig.match_server(servers, self.environment, self.product)
+            else:
+                self._server = ProjectConfig.fetch_text(self.configuration, "Server")
         return self._server
 
+    @property
+    def suites_per_jvm(self):
+        """
+        Return the number of test suites run by each launch of the Java virtual machine.
+        The default is one.
+        """
+        if self._suites_per_jvm is None:
+            self._suites_per_jvm = ProjectConfig.fetch_count(self.configuration, "SuitesPerJvm", 1)
+        return self._suites_per_jvm
+
+    @property
+    def parallelism(self):
+        """
+        Return the number of Java virtual machines that rungfit.bat may run at the same
+        time.  The default is one, which runs the test suites one after another.
+        """
+        if self._parallelism is None:
+            self._parallelism = ProjectConfig.fetch_count(self.configuration, "Parallelism", 1)
+        return self._parallelism
+
+    @property
+    def shards(self):
+        """
+        Return the number of parallel Jenkins stages the test suites are split into.
+        The default is one.
+        """
+        if self._shards is None:
+            self._shards = ProjectConfig.fetch_count(self.configuration, "Shards", 1)
+        return self._shards
+
+    @property
+    def agent_label(self):
+        """
+        Return the label of the Jenkins agents that run the tests.  The default is master.
+        """
+        if self._agent_label is None:
+            self._agent_label = "master"
+            if ProjectConfig.has_element(self.configuration, "AgentLabel"):
+                self._agent_label = ProjectConfig.fetch_text(self.configuration, "AgentLabel")
+        return self._agent_label
+
+    @property
+    def discovery(self):
+        """
+        Return a tuple of the lists of Include and Exclude patterns of the
+        DiscoverSuites element, or None if the test suites are listed instead.  With
+        no Include element, every suite is included.
+        """
+        if self._discovery is _unread:
+            self._discovery = None
+            if ProjectConfig.has_element(self.configuration, "DiscoverSuites"):
+                if ProjectConfig.has_element(self.configuration, "TestSuites"):
+                    message = "TestSuites and DiscoverSuites cannot both be used"
+                    raise ProjectConfigException(message)
+                element = ProjectConfig.fetch_element(self.configuration, "DiscoverSuites")
+                includes = ProjectConfig.fetch_all_texts(element, "Include")
+                excludes = ProjectConfig.fetch_all_texts(element, "Exclude")
+                if len(includes) == 0:
+                    includes = ["*"]
+                self._discovery = (includes, excludes)
+        return self._discovery
+
+    @property
+    def timeouts(self):
+        """
+        Return a dictionary of test suite name to the timeout in seconds given in the
+        timeout attribute of its TestSuite element.  Suites without the attribute
+        are not included.
+        """
+        if self._timeouts is None:
+            timeouts = {}
+            if self.discovery is None:
+                test_suite_root = ProjectConfig.fetch_element(self.configuration, "TestSuites")
+                for test_suite_element in ProjectConfig.fetch_all_elements(test_suite_root, "TestSuite"):
+                    ProjectConfig.add_timeout(timeouts, test_suite_element)
+            self._timeouts = timeouts
+        return self._timeouts
+
+    @property
+    def timeout_policy(self):
+        """
+        Return a tuple of the factor applied to the recorded durations of a suite,
+        and the shortest and longest timeouts in seconds, from the attributes of the
+        SuiteTimeouts element.  Missing attributes take their default values.
+        """
+        if self._timeout_policy is None:
+            factor, floor, ceiling = default_timeout_policy
+            if ProjectConfig.has_element(self.configuration, "SuiteTimeouts"):
+                element = ProjectConfig.fetch_element(self.configuration, "SuiteTimeouts")
+                factor = ProjectConfig.fetch_number(element, "factor", factor, float)
+                floor = ProjectConfig.fetch_number(element, "floor", floor, int)
+                ceiling = ProjectConfig.fetch_number(element, "ceiling", ceiling, int)
+                if floor > ceiling:
+                    message = "The floor of SuiteTimeouts must not be greater than its ceiling"
+                    raise ProjectConfigException(message)
+            self._timeout_policy = (factor, floor, ceiling)
+        return self._timeout_policy
+
+    @property
+    def matrix(self):
+        """
+        Return the list of (environment, product, server) combinations of the
+        configuration, in the order the environments and products are listed.  A
+        configuration with one environment and one product has one combination.
+        """
+        if self._matrix is None:
+            configuration = self.configuration
+            ProjectConfig.fetch_element(configuration, "Environment")
+            ProjectConfig.fetch_element(configuration, "Product")
+            ProjectConfig.fetch_element(configuration, "Server")
+            environments = ProjectConfig.fetch_all_texts(configuration, "Environment")
+            products = ProjectConfig.fetch_all_texts(configuration, "Product")
+            for product in products:
+                ProjectConfig.check_product(product)
+            servers = ProjectConfig.fetch_all_elements(configuration, "Server")
+            combinations = []
+            for environment in environments:
+                for product in products:
+                    server = ProjectConfig.match_server(servers, environment, product)
+                    combinations.append((environment, product, server))
+            self._matrix = combinations
+        return self._matrix
+
+    @property
+    def filename(self):
+        """Return the name of the project config file"""
+        return self._filename
+
+    @property
+    def streaming(self):
+        """Return true if the test suites are streamed from the file"""
+        return self._streaming
+
+    @property
+    def dependencies(self):
+        """Return the full path names of the base configurations this configuration
+        inherits from, nearest first"""
+        return self._dependencies
+
     # ---------------------------------------------------------------------------
     #  Operations
     # ---------------------------------------------------------------------------
@@ -154,17 +389,287 @@ class ProjectConfig:
         """
         if not ProjectConfig.file_exists(self._filename):
             raise ProjectConfigException("Project config file does not exist - " + self._filename)
+        if self._streaming:
+            self.parse_streaming()
+            return
         try:
             tree = Et.parse(self._filename)
             root = tree.getroot()
             tag = root.tag
             if tag != "TestConfiguration":
                 raise ProjectConfigException("Root element is not TestConfiguration - " + tag)
-            self._configuration = root
+            self._configuration = self.inherit(root)
         except Exception as e:
             raise ProjectConfigException(str(e))
         return
 
+    def parse_streaming(self):
+        """
+        Parse the project config file incrementally.  Every element except the
+        individual test suites is kept, so the other properties work as usual.  The
+        test suites are counted and discarded as they are read.
+        """
+        root = None
+        test_suite_root = None
+        in_test_suites = False
+        count = 0
+        timeouts = {}
+        depth = 0
+        try:
+            for event, element in Et.iterparse(self._filename, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = element
+                        if root.tag != "TestConfiguration":
+                            raise ProjectConfigException("Root element is not TestConfiguration - " + root.tag)
+                    elif depth == 2 and element.tag == "TestSuites" and test_suite_root is None:
+                        in_test_suites = True
+                        test_suite_root = element
+                    continue
+                depth -= 1
+                if depth == 2 and in_test_suites and element.tag == "TestSuite":
+                    count += 1
+                    ProjectConfig.add_timeout(timeouts, element)
+                    test_suite_root.remove(element)
+                elif depth == 1:
+                    in_test_suites = False
+        except ProjectConfigException as e:
+            raise e
+        except Exception as e:
+            raise ProjectConfigException(str(e))
+        self._configuration = self.inherit(root)
+        self._test_suite_count = count
+        if self.discovery is None:
+            self._timeouts = timeouts
+        return
+
+    def iter_test_suites(self):
+        """
+        Return an iterator over the names of the test suites that reads the file
+        incrementally and discards each element once it has been read.
+        """
+        depth = 0
+        in_test_suites = False
+        test_suite_root = None
+        try:
+            for event, element in Et.iterparse(self._filename, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and element.tag == "TestSuites" and test_suite_root is None:
+                        in_test_suites = True
+                        test_suite_root = element
+                    continue
+                depth -= 1
+                if depth == 2 and in_test_suites and element.tag == "TestSuite":
+                    text = element.text
+                    test_suite_root.remove(element)
+                    yield text
+                elif depth == 1 and in_test_suites:
+                    # The remainder of the file has no test suites
+                    break
+                elif depth == 1:
+                    element.clear()
+        except Exception as e:
+            raise ProjectConfigException(str(e))
+        return
+
+    def set_discovered_suites(self, test_suites):
+        """
+        Set the test suites found by discovery.
+
+        Argument:
+            test_suites - the list of test suite names
+        """
+        assert self.discovery is not None, "Test suites are only set when they are discovered"
+        if len(test_suites) == 0:
+            message = "No test suites were discovered"
+            raise ProjectConfigException(message)
+        self._test_suites = test_suites
+        return
+
+    def inherit(self, root):
+        """
+        Return the TestConfiguration element with the elements of its base
+        configurations merged in, and record the base files as dependencies.
+
+        Argument:
+            root - the TestConfiguration element of this file
+        """
+        self._dependencies = []
+        base_name = root.get("extends")
+        if base_name is None:
+            return root
+        base_filename = ProjectConfig.base_filename(self._filename, base_name)
+        stamps, base = ProjectConfig.load_base(base_filename, [ProjectConfig.base_key(self._filename)])
+        self._dependencies = [stamp[0] for stamp in stamps]
+        return ProjectConfig.merge(base, root)
+
+    def expand(self):
+        """
+        Return the list of configurations for the combinations of a matrix
+        configuration, or a list holding only this configuration if it has a single
+        combination.  The configurations share the parsed file and the fields that
+        are the same for every combination.
+        """
+        if len(self.matrix) == 1:
+            return [self]
+        return [self.combination(environment, product, server)
+                for environment, product, server in self.matrix]
+
+    def combination(self, environment, product, server):
+        """
+        Return the configuration of one combination of a matrix configuration.
+
+        Arguments:
+            environment - the name of the environment
+            product - the product abbreviation
+            server - the name of the server
+        """
+        project_config = ProjectConfig(self._filename, self._streaming)
+        project_config._configuration = self._configuration
+        project_config._test_suite_count = self._test_suite_count
+        project_config._dependencies = self._dependencies
+        for name in ProjectConfig.snapshot_fields:
+            if name in ProjectConfig.matrix_fields:
+                continue
+            if name == "test_suites" and (self._streaming or self.discovery is not None):
+                continue
+            setattr(project_config, "_" + name, getattr(self, name))
+        project_config._environment = environment
+        project_config._product = product
+        project_config._server = server
+        project_config._matrix = [(environment, product, server)]
+        if len(set(combination[1] for combination in self.matrix)) > 1:
+            project_config._workspace_project = self.project + "-" + product
+        return project_config
+
+    def snapshot(self):
+        """
+        Return a dictionary with the value of every field of the configuration.  The
+        configuration must have been parsed.  The snapshot can be pickled and later
+        passed to from_snapshot without parsing the XML again.
+        """
+        assert not self._streaming, "A streaming configuration cannot be saved in a snapshot"
+        snapshot = {}
+        for name in ProjectConfig.snapshot_fields:
+            if name == "test_suites" and self.discovery is not None:
+                # Discovered suites depend on the directory, not on the file
+                snapshot[name] = None
+                continue
+            snapshot[name] = getattr(self, name)
+        return snapshot
+
+    @staticmethod
+    def from_snapshot(project_config_filename, snapshot, dependencies=None):
+        """
+        Return a ProjectConfig whose fields are set from a snapshot rather than
+        parsed from the XML file.
+
+        Arguments:
+            project_config_filename - the full path to the project config file
+            snapshot - a dictionary produced by the snapshot method
+            dependencies - the file names of the base configurations, or None
+        """
+        project_config = ProjectConfig(project_config_filename)
+        if dependencies is not None:
+            project_config._dependencies = list(dependencies)
+        for name in ProjectConfig.snapshot_fields:
+            if name not in snapshot:
+                raise ProjectConfigException("Snapshot is missing the field " + name)
+            setattr(project_config, "_" + name, snapshot[name])
+        return project_config
+
+    @staticmethod
+    def load_base(filename, chain):
+        """
+        Return the file stamps and the merged TestConfiguration element of a base
+        configuration, parsing it only if it is not cached or one of its files has
+        changed.
+
+        Arguments:
+            filename - the full path name of the base configuration
+            chain - the keys of the configurations that extend this one, to find
+                cycles
+        """
+        key = ProjectConfig.base_key(filename)
+        if key in chain:
+            raise ProjectConfigException("Base configurations extend each other - " + filename)
+        with _base_lock:
+            entry = _base_cache.get(key)
+        if entry is not None and ProjectConfig.file_stamps([stamp[0] for stamp in entry[0]]) == entry[0]:
+            return entry
+        stamps = ProjectConfig.file_stamps([os.path.abspath(filename)])
+        if stamps[0][1] is None:
+            raise ProjectConfigException("Base config file does not exist - " + filename)
+        root = Et.parse(filename).getroot()
+        if root.tag != "TestConfiguration":
+            raise ProjectConfigException("Root element is not TestConfiguration - " + filename)
+        base_name = root.get("extends")
+        if base_name is not None:
+            parent_stamps, parent = ProjectConfig.load_base(ProjectConfig.base_filename(filename, base_name),
+                                                            chain + [key])
+            stamps = stamps + parent_stamps
+            root = ProjectConfig.merge(parent, root)
+        entry = (stamps, root)
+        with _base_lock:
+            _base_cache[key] = entry
+        return entry
+
+    @staticmethod
+    def merge(base, root):
+        """
+        Return a TestConfiguration element with the elements of root and every
+        element of base whose tag does not appear in root.  The elements are shared,
+        not copied.
+
+        Arguments:
+            base - the TestConfiguration element of the base configuration
+            root - the TestConfiguration element of the configuration
+        """
+        tags = set(element.tag for element in root)
+        merged = Et.Element(root.tag, root.attrib)
+        for element in base:
+            if element.tag not in tags:
+                merged.append(element)
+        for element in root:
+            merged.append(element)
+        return merged
+
+    @staticmethod
+    def base_filename(filename, base_name):
+        """
+        Return the path of a base configuration named in a configuration file.
+
+        Arguments:
+            filename - the configuration file that names the base
+            base_name - the value of its extends attribute
+        """
+        return os.path.join(os.path.dirname(filename), base_name)
+
+    @staticmethod
+    def base_key(filename):
+        """Return the key of a configuration file in the base cache"""
+        return os.path.normcase(os.path.abspath(filename))
+
+    @staticmethod
+    def file_stamps(filenames):
+        """
+        Return a list of [file name, modification time, size] for each file.  The
+        time and size are None if the file does not exist.
+
+        Argument:
+            filenames - the full path names of the files
+        """
+        stamps = []
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+                stamps.append([filename, stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                stamps.append([filename, None, None])
+        return stamps
+
     @staticmethod
     def file_exists(filename):
         """
@@ -212,6 +717,73 @@ class ProjectConfig:
         element = ProjectConfig.fetch_element(parent, tag)
         return element.text
 
+    @staticmethod
+    def fetch_all_texts(parent, tag):
+        """
+        Return the distinct contents of the subelements of the parent with the
+        specified tag, in the order they appear.
+
+        Arguments:
+            parent - the parent element being searched
+            tag - the tag of the elements
+        """
+        texts = []
+        for element in ProjectConfig.fetch_all_elements(parent, tag):
+            if element.text not in texts:
+                texts.append(element.text)
+        return texts
+
+    @staticmethod
+    def match_server(servers, environment, product):
+        """
+        Return the name of the server for an environment and product.  A Server
+        element applies to the combinations allowed by its environment and product
+        attributes, and the element with the most matching attributes is used.  If no
+        element or more than one element is the best match, an exception is thrown.
+
+        Arguments:
+            servers - the list of Server elements
+            environment - the name of the environment
+            product - the product abbreviation
+        """
+        best = []
+        best_score = -1
+        for server in servers:
+            score = 0
+            for attribute, value in (("environment", environment), ("product", product)):
+                if attribute in server.attrib:
+                    if server.get(attribute) != value:
+                        score = -1
+                        break
+                    score += 1
+            if score < 0 or score < best_score:
+                continue
+            if score > best_score:
+                best = []
+                best_score = score
+            best.append(server.text)
+        if len(best) == 0:
+            message = "No Server applies to environment " + str(environment) + " and product " + str(product)
+            raise ProjectConfigException(message)
+        if len(best) > 1:
+            message = "More than one Server applies to environment " + str(environment) + \
+                " and product " + str(product)
+            raise ProjectConfigException(message)
+        return best[0]
+
+    @staticmethod
+    def check_product(product):
+        """
+        Check that a product abbreviation is valid.  If not, throw an exception.
+
+        Argument:
+            product - the product abbreviation
+        """
+        if product not in ProjectConfig.products:
+            message = "Invalid product abbreviation - " + str(product)
+            raise ProjectConfigException(message)
+        return
+
     @staticmethod
     def fetch_all_elements(parent, tag):
         """
@@ -229,6 +801,69 @@ class ProjectConfig:
             elements = []
         return elements
 
+    @staticmethod
+    def fetch_count(parent, tag, default):
+        """
+        Return the positive integer content of an optional element, or the default
+        if the element is not present.  If the content is not a positive integer, an
+        exception is thrown.
+
+        Arguments:
+            parent - the parent of the element being searched for
+            tag - the name of the element to be retrieved
+            default - the value returned if the element is not present
+        """
+        if not ProjectConfig.has_element(parent, tag):
+            return default
+        text = ProjectConfig.fetch_text(parent, tag)
+        try:
+            value = int(text.strip())
+        except (AttributeError, ValueError):
+            value = 0
+        if value < 1:
+            message = "Element " + tag + " must be a positive integer - " + str(text)
+            raise ProjectConfigException(message)
+        return value
+
+    @staticmethod
+    def fetch_number(element, name, default, kind):
+        """
+        Return the positive number in an optional attribute, or the default if the
+        attribute is not present.  If the value is not a positive number, an
+        exception is thrown.
+
+        Arguments:
+            element - the element holding the attribute
+            name - the name of the attribute
+            default - the value returned if the attribute is not present
+            kind - int or float
+        """
+        text = element.get(name)
+        if text is None:
+            return default
+        try:
+            value = kind(text.strip())
+        except ValueError:
+            value = 0
+        if not 0 < value < float("inf"):
+            message = "Attribute " + name + " of " + element.tag + " must be a positive number - " + text
+            raise ProjectConfigException(message)
+        return value
+
+    @staticmethod
+    def add_timeout(timeouts, test_suite_element):
+        """
+        Add the timeout in the timeout attribute of a TestSuite element, if any, to
+        a dictionary of test suite name to timeout.
+
+        Arguments:
+            timeouts - the dictionary of timeouts
+            test_suite_element - a TestSuite element
+        """
+        if test_suite_element.get("timeout") is not None:
+            timeouts[test_suite_element.text] = ProjectConfig.fetch_number(test_suite_element, "timeout", None, int)
+        return
+
     @staticmethod
     def has_element(parent, tag):
         """
@@ -0,0 +1,276 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module reads the JUnit XML reports that GFIT writes to the reports directory
+of each test suite.  The reports are read incrementally, so large reports are never
+held in memory.
+"""
+
+import os
+import xml.etree.ElementTree as Et
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import instrumentation
+
+ReportSummary = namedtuple("ReportSummary", ["tests", "failures", "errors", "skipped", "time"])
+ReportCase = namedtuple("ReportCase", ["classname", "name", "time", "outcome", "message", "detail"])
+
+# Most characters of the text of a failure or error kept for a test case
+max_detail = 4000
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def find_report_files(reports_dir, stamps=None):
+    """
+    Return the list of XML files in a reports directory and its subdirectories.  A
+    missing directory has no reports.
+
+    Arguments:
+        reports_dir - the reports directory of a test suite
+        stamps - a list that receives the name and modification time of each
+            directory read and each XML file found, or None
+    """
+    report_files = []
+    pending = [reports_dir]
+    while len(pending) > 0:
+        dir_name = pending.pop()
+        try:
+            if stamps is not None:
+                instrumentation.recorder.count("stat")
+                stamps.append([dir_name, os.stat(dir_name).st_mtime_ns])
+            instrumentation.recorder.count("scandir")
+            with os.scandir(dir_name) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith(".xml"):
+                        report_files.append(entry.path)
+                        if stamps is not None:
+                            # On Windows the listing already holds the time
+                            stamps.append([entry.path, entry.stat().st_mtime_ns])
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    report_files.sort()
+    return report_files
+
+
+def latest_mtime(report_files):
+    """
+    Return the latest modification time in nanoseconds of a list of files, or 0 if
+    there are none.
+
+    Argument:
+        report_files - the names of the files
+    """
+    latest = 0
+    for report_file in report_files:
+        instrumentation.recorder.count("stat")
+        try:
+            latest = max(latest, os.stat(report_file).st_mtime_ns)
+        except OSError:
+            continue
+    return latest
+
+
+def read_report_summary(report_file):
+    """
+    Return the ReportSummary of a JUnit XML report, or None if the file is not a
+    readable JUnit report.  The totals on the outermost testsuites or testsuite
+    element are used when present; otherwise the test cases are counted.
+
+    Argument:
+        report_file - the name of the report file
+    """
+    tests = 0
+    failures = 0
+    errors = 0
+    skipped = 0
+    time = 0.0
+    depth = 0
+    suite_depth = None
+    count_cases = False
+    try:
+        for event, element in Et.iterparse(report_file, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    if tag not in ("testsuite", "testsuites"):
+                        return None
+                    if tag == "testsuites" and has_totals(element):
+                        return summary_from_attributes(element)
+                if tag == "testsuite" and suite_depth is None:
+                    suite_depth = depth
+                    count_cases = not has_totals(element)
+                    if not count_cases:
+                        totals = summary_from_attributes(element)
+                        tests += totals.tests
+                        failures += totals.failures
+                        errors += totals.errors
+                        skipped += totals.skipped
+                        time += totals.time
+                continue
+            if tag == "testcase" and suite_depth is not None:
+                if count_cases:
+                    tests += 1
+                    time += to_number(element.get("time"), float)
+                    if element.find("failure") is not None:
+                        failures += 1
+                    if element.find("error") is not None:
+                        errors += 1
+                    if element.find("skipped") is not None:
+                        skipped += 1
+                element.clear()
+            elif tag == "testsuite" and depth == suite_depth:
+                suite_depth = None
+                element.clear()
+            depth -= 1
+    except (Et.ParseError, OSError):
+        return None
+    return ReportSummary(tests, failures, errors, skipped, time)
+
+
+def read_reports_summary(reports_dir):
+    """
+    Return the combined ReportSummary of every report in a reports directory, or
+    None if there are no readable reports.
+
+    Argument:
+        reports_dir - the reports directory of a test suite
+    """
+    combined = None
+    for report_file in find_report_files(reports_dir):
+        summary = read_report_summary(report_file)
+        if summary is None:
+            continue
+        if combined is None:
+            combined = summary
+        else:
+            combined = ReportSummary(*[a + b for a, b in zip(combined, summary)])
+    return combined
+
+
+def read_report_cases(report_file, detail_limit=max_detail):
+    """
+    Return the list of ReportCase of the test cases in a JUnit XML report, or None
+    if the file is not a readable JUnit report.  The outcome of a case is passed,
+    failure, error or skipped.  The output of the tests is dropped and the text of
+    a failure or error is cut to a limit, so the cases are much smaller than the
+    report.
+
+    Arguments:
+        report_file - the name of the report file
+        detail_limit - the most characters of failure or error text kept
+    """
+    cases = []
+    depth = 0
+    try:
+        for event, element in Et.iterparse(report_file, events=("start", "end")):
+            tag = element.tag
+            if event == "start":
+                depth += 1
+                if depth == 1 and tag not in ("testsuite", "testsuites"):
+                    return None
+                continue
+            depth -= 1
+            if tag == "testcase":
+                cases.append(case_from_element(element, detail_limit))
+                element.clear()
+            elif tag in ("system-out", "system-err"):
+                element.clear()
+    except (Et.ParseError, OSError):
+        return None
+    return cases
+
+
+def case_from_element(element, detail_limit=max_detail):
+    """Return the ReportCase of a testcase element"""
+    outcome = "passed"
+    message = ""
+    detail = ""
+    for name in ("error", "failure", "skipped"):
+        child = element.find(name)
+        if child is not None:
+            outcome = name
+            message = child.get("message", "")
+            detail = (child.text or "")[:detail_limit]
+            break
+    return ReportCase(element.get("classname", ""), element.get("name", ""),
+                      to_number(element.get("time"), float), outcome, message, detail)
+
+
+def find_failed_suites(test_suites, reports_dir, io_workers=4):
+    """
+    Return the test suites whose reports record a failure or an error, and the test
+    suites without a readable report, each in the order they are listed.  The
+    reports of the suites are read concurrently.
+
+    Arguments:
+        test_suites - the names of the test suites
+        reports_dir - a function that returns the reports directory of a test suite
+        io_workers - the number of threads that read reports
+    """
+    test_suites = list(test_suites)
+    with ThreadPoolExecutor(max_workers=io_workers) as executor:
+        summaries = list(executor.map(lambda suite: read_reports_summary(reports_dir(suite)), test_suites))
+    failed = []
+    unreported = []
+    for test_suite, summary in zip(test_suites, summaries):
+        if summary is None:
+            unreported.append(test_suite)
+        elif summary.failures > 0 or summary.errors > 0:
+            failed.append(test_suite)
+    return failed, unreported
+
+
+def has_totals(element):
+    """Return true if a testsuite or testsuites element carries its own totals"""
+    return "tests" in element.attrib and "time" in element.attrib
+
+
+def summary_from_attributes(element):
+    """Return the ReportSummary recorded in the attributes of an element"""
+    return ReportSummary(
+        to_number(element.get("tests"), int),
+        to_number(element.get("failures"), int),
+        to_number(element.get("errors"), int),
+        to_number(element.get("skipped"), int),
+        to_number(element.get("time"), float))
+
+
+def to_number(text, kind):
+    """
+    Return the text converted to a number, or zero if it is missing or malformed.
+
+    Arguments:
+        text - the text of an attribute
+        kind - int or float
+    """
+    if text is None:
+        return kind(0)
+    try:
+        return kind(text.replace(",", ""))
+    except ValueError:
+        return kind(0)
@@ -0,0 +1,368 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module runs the Project Configuration tool as a long running server, so that
+a Jenkins job does not pay for interpreter startup, imports and parsing on every
+run.  The server keeps parsed project configurations and directory listings between
+requests and listens on a localhost port or a Unix domain socket.  Requests and
+responses are single lines of JSON; client.py sends them.
+
+    python server.py --port 47800
+    python server.py --socket /tmp/projectconfig.sock
+
+Relative paths in a project config file are resolved against the working directory
+of the server.
+"""
+
+import argparse
+import contextvars
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import client
+import main
+from dircache import DirectoryCache
+from projectconfig import ProjectConfig
+from projectconfigexception import ProjectConfigException
+
+# The buffer receiving the console output of the current request, if any
+_capture = contextvars.ContextVar("capture", default=None)
+
+# -------------------------------------------------------------------------------
+#  Output capture
+# -------------------------------------------------------------------------------
+
+
+class CapturingStdout:
+    """
+    This class replaces sys.stdout in the server.  Output written while a request is
+    being handled goes to the buffer of that request; other output goes to the
+    original stream.  The buffer is held in a context variable, so requests handled
+    on different threads do not mix their output.
+    """
+
+    def __init__(self, stream):
+        """Initialize the class.
+
+        Argument:
+            stream - the original standard output
+        """
+        self._stream = stream
+        return
+
+    def write(self, text):
+        buffer = _capture.get()
+        if buffer is None:
+            return self._stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if _capture.get() is None:
+            self._stream.flush()
+        return
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class ProjectServer:
+    """
+    This class handles the requests sent to the server.  It keeps each parsed
+    project configuration until the modification time or size of its file changes,
+    shares a revalidating DirectoryCache between requests, and never runs two
+    requests for the same project at the same time.
+    """
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, io_workers=main.default_io_workers):
+        """Initialize the class.
+
+        Argument:
+            io_workers - the number of threads used for file system checks
+        """
+        assert io_workers > 0, "Number of I/O workers must be positive"
+        self._io_workers = io_workers
+        self._configs = {}
+        self._project_locks = {}
+        self._lock = threading.Lock()
+        self._dir_cache = DirectoryCache(revalidate=True)
+        self._requests = 0
+        self._hits = 0
+        self._misses = 0
+        self._started = time.time()
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def dir_cache(self):
+        """Return the directory cache shared by the requests"""
+        return self._dir_cache
+
+    @property
+    def stats(self):
+        """Return the counters of the server as a dictionary"""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "config_hits": self._hits,
+                "config_misses": self._misses,
+                "configs": len(self._configs),
+                "directory_scans": self._dir_cache.scans,
+                "uptime": round(time.time() - self._started, 1)
+            }
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def handle(self, request):
+        """
+        Return the response to a request.
+
+        Argument:
+            request - the request as a dictionary
+        """
+        command = request.get("command") if isinstance(request, dict) else None
+        if command == "generate":
+            config = request.get("config")
+            if not isinstance(config, str) or len(config) == 0:
+                return ProjectServer.failure("Error: The request does not name a project config file")
+            return self.generate(config, request.get("streaming", False))
+        if command in ("ping", "shutdown"):
+            return {"succeeded": True, "message": "", "output": ""}
+        if command == "stats":
+            return {"succeeded": True, "message": "", "output": "", "stats": self.stats}
+        return ProjectServer.failure("Error: Unknown command - " + str(command))
+
+    def generate(self, project_config_filename, streaming=False):
+        """
+        Regenerate the files of a project and return the response.
+
+        Arguments:
+            project_config_filename - the full path to the project config file
+            streaming - if true, stream the test suites from the XML file.  A
+                streaming configuration is parsed on every request.
+        """
+        with self._lock:
+            self._requests += 1
+        buffer = io.StringIO()
+        token = _capture.set(buffer)
+        succeeded = False
+        message = ""
+        start = time.perf_counter()
+        try:
+            with self.project_lock(project_config_filename):
+                project_config = self.load(project_config_filename, streaming)
+                main.generate_all(project_config, self._dir_cache, self._io_workers)
+            succeeded = True
+        except ProjectConfigException as e:
+            message = "Error: " + str(e)
+        except Exception as e:
+            message = "Exception: " + str(e) + "\n" + traceback.format_exc()
+        finally:
+            _capture.reset(token)
+        return {
+            "succeeded": succeeded,
+            "message": message,
+            "output": buffer.getvalue(),
+            "seconds": round(time.perf_counter() - start, 6)
+        }
+
+    def load(self, project_config_filename, streaming=False):
+        """
+        Return the parsed project configuration, reusing the one kept from an earlier
+        request if the file and its base configurations have the same modification
+        times and sizes.
+
+        Arguments:
+            project_config_filename - the full path to the project config file
+            streaming - if true, parse the file in streaming mode without keeping it
+        """
+        if streaming:
+            return main.load_project_config(project_config_filename, streaming=True)
+        key = ProjectServer.key(project_config_filename)
+        try:
+            stat = os.stat(project_config_filename)
+        except OSError:
+            with self._lock:
+                self._configs.pop(key, None)
+            # Let the parser report the missing file in the usual way
+            return main.load_project_config(project_config_filename)
+        with self._lock:
+            entry = self._configs.get(key)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size and \
+                ProjectConfig.file_stamps(entry[3].dependencies) == entry[2]:
+            with self._lock:
+                self._hits += 1
+            return entry[3]
+        with self._lock:
+            self._misses += 1
+        project_config = ProjectConfig(project_config_filename)
+        project_config.parse()
+        with self._lock:
+            self._configs[key] = (stat.st_mtime_ns, stat.st_size,
+                                  ProjectConfig.file_stamps(project_config.dependencies), project_config)
+        return project_config
+
+    def project_lock(self, project_config_filename):
+        """
+        Return the lock that serializes the requests for a project.
+
+        Argument:
+            project_config_filename - the full path to the project config file
+        """
+        key = ProjectServer.key(project_config_filename)
+        with self._lock:
+            return self._project_locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def key(project_config_filename):
+        """Return the key of a project config file in the caches"""
+        return os.path.normcase(os.path.abspath(project_config_filename))
+
+    @staticmethod
+    def failure(message):
+        """Return the response to a request that could not be handled"""
+        return {"succeeded": False, "message": message, "output": ""}
+
+
+# -------------------------------------------------------------------------------
+#  Socket servers
+# -------------------------------------------------------------------------------
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """This class reads the requests on one connection and writes the responses"""
+
+    def handle(self):
+        for line in self.rfile:
+            if len(line.strip()) == 0:
+                continue
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError:
+                request = None
+                response = ProjectServer.failure("Error: The request is not valid JSON")
+            else:
+                response = self.server.project_server.handle(request)
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            if isinstance(request, dict) and request.get("command") == "shutdown":
+                threading.Thread(target=self.server.shutdown).start()
+                return
+        return
+
+
+class TcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """This class serves requests on a TCP port"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+
+    class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """This class serves requests on a Unix domain socket"""
+
+        daemon_threads = True
+
+
+def create_server(project_server, host=client.default_host, port=client.default_port, socket_path=None):
+    """
+    Return a socket server bound to a port or a Unix domain socket.
+
+    Arguments:
+        project_server - the ProjectServer that handles the requests
+        host - the host name to listen on
+        port - the port to listen on
+        socket_path - the path of a Unix domain socket, used instead of the port
+    """
+    if socket_path is not None:
+        if not hasattr(socketserver, "UnixStreamServer"):
+            raise ProjectConfigException("Unix domain sockets are not available on this platform")
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixServer(socket_path, RequestHandler)
+    else:
+        server = TcpServer((host, port), RequestHandler)
+    server.project_server = project_server
+    return server
+
+
+# -------------------------------------------------------------------------------
+#  Main
+# -------------------------------------------------------------------------------
+
+
+def parse_arguments(argv):
+    """
+    Return the parsed command line arguments.
+
+    Arguments:
+        argv - the command line arguments without the program name
+    """
+    parser = argparse.ArgumentParser(prog="server.py", description="Run the ProjectConfig server.")
+    parser.add_argument("--host", default=client.default_host,
+                        help="host name to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=client.default_port,
+                        help="port to listen on (default: %(default)s)")
+    parser.add_argument("--socket", default=None, dest="socket_path",
+                        help="Unix domain socket to listen on instead of the port")
+    parser.add_argument("--io-workers", type=int, default=main.default_io_workers,
+                        help="number of threads for file system checks (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    """Run the ProjectConfig server"""
+    arguments = parse_arguments(sys.argv[1:])
+    sys.stdout = CapturingStdout(sys.stdout)
+    socket_server = create_server(ProjectServer(arguments.io_workers), arguments.host, arguments.port,
+                                  arguments.socket_path)
+    where = arguments.socket_path if arguments.socket_path is not None else \
+        arguments.host + ":" + str(arguments.port)
+    print("ProjectConfig server listening on " + where)
+    try:
+        socket_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket_server.server_close()
+        if arguments.socket_path is not None and os.path.exists(arguments.socket_path):
+            os.remove(arguments.socket_path)
+    print("ProjectConfig server stopped")
@@ -0,0 +1,82 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module contains the functions that split the test suites of a project into
+shards that run on separate Jenkins agents.
+"""
+
+import heapq
+
+
+# -------------------------------------------------------------------------------
+#  Functions
+# -------------------------------------------------------------------------------
+
+
+def split_round_robin(test_suites, count):
+    """
+    Return the test suites dealt into at most count shards, in the order they are
+    listed.  Empty shards are left out.
+
+    Arguments:
+        test_suites - the names of the test suites
+        count - the number of shards
+    """
+    assert count > 0, "Number of shards must be positive"
+    shards = [[] for _ in range(count)]
+    for index, test_suite in enumerate(test_suites):
+        shards[index % count].append(test_suite)
+    return [shard for shard in shards if len(shard) > 0]
+
+
+def pack_longest_first(test_suites, count, duration):
+    """
+    Return the test suites packed into at most count shards of nearly equal total
+    duration.  The suites are taken longest first and each is given to the shard
+    with the least work so far.  Within a shard the suites stay longest first.
+    Empty shards are left out.
+
+    Arguments:
+        test_suites - the names of the test suites
+        count - the number of shards
+        duration - a function that returns the expected duration of a test suite
+    """
+    assert count > 0, "Number of shards must be positive"
+    ordered = order_longest_first(test_suites, duration)
+    shards = [[] for _ in range(count)]
+    loads = [(0.0, index) for index in range(count)]
+    for test_suite in ordered:
+        load, index = heapq.heappop(loads)
+        shards[index].append(test_suite)
+        heapq.heappush(loads, (load + duration(test_suite), index))
+    return [shard for shard in shards if len(shard) > 0]
+
+
+def order_longest_first(test_suites, duration):
+    """
+    Return the test suites sorted by expected duration, longest first.  Suites with
+    the same duration keep the order in which they are listed.
+
+    Arguments:
+        test_suites - the names of the test suites
+        duration - a function that returns the expected duration of a test suite
+    """
+    return sorted(test_suites, key=duration, reverse=True)
@@ -0,0 +1,298 @@
+# -------------------------------------------------------------------------------
+#
+#  Copyright (c) 2018 Waysys LLC
+#
+# -------------------------------------------------------------------------------
+#
+#  Waysys LLC MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY OF
+#  THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+#  TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+#  PARTICULAR PURPOSE, OR NON-INFRINGEMENT. CastleBay SHALL NOT BE LIABLE FOR
+#  ANY DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING OR
+#  DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+#
+# For further information, contact wshaffer@waysysweb.com
+#
+# -------------------------------------------------------------------------------
+
+__author__ = 'Bill Shaffer'
+__version__ = "1.00"
+
+"""
+This module contains the ProjectWatcher class that regenerates the files of
+projects whenever their project config files change.
+"""
+
+import os
+import time
+import main
+from dircache import DirectoryCache
+from filecreator import BatFileCreator
+from filecreator import OutputManifest
+from filecreator import PropertyCreator
+from filecreator import StagedWriter
+from projectconfig import ProjectConfig
+from projectconfigexception import ProjectConfigException
+
+# Default seconds between polls and seconds a change must be stable before it is used
+default_poll_interval = 1.0
+default_debounce = 0.5
+
+# Fields whose changes are handled without regenerating everything
+suite_fields = {"test_suites"}
+server_fields = {"server"}
+
+# -------------------------------------------------------------------------------
+#  Class description
+# -------------------------------------------------------------------------------
+
+
+class ProjectWatcher:
+    """
+    This class polls the modification time and size of project config files and,
+    optionally, of the directories holding their test suites.  When a config file
+    changes, the new configuration is compared with the last good one and only the
+    affected files are generated again:
+
+        test suites - the properties files of added suites and the batch files;
+            properties files of removed suites are deleted
+        server - the properties files
+        anything else - every file, as in a normal run
+
+    A change to a test suite directory checks the test suites again.
+    """
+
+    # ---------------------------------------------------------------------------
+    #  Constructor
+    # ---------------------------------------------------------------------------
+
+    def __init__(self, filenames, io_workers=main.default_io_workers, watch_suites=False):
+        """Initialize the class.
+
+        Arguments:
+            filenames - the project config files to be watched
+            io_workers - the number of threads used for file system checks
+            watch_suites - if true, also watch the test suite directory of each project
+        """
+        assert len(filenames) > 0, "At least one project config file must be watched"
+        self._filenames = list(filenames)
+        self._io_workers = io_workers
+        self._watch_suites = watch_suites
+        self._configs = {}
+        self._failed = set()
+        self._snapshots = {}
+        self._dir_cache = DirectoryCache(revalidate=True)
+        return
+
+    # ---------------------------------------------------------------------------
+    #  Properties
+    # ---------------------------------------------------------------------------
+
+    @property
+    def filenames(self):
+        """Return the watched project config files"""
+        return self._filenames
+
+    # ---------------------------------------------------------------------------
+    #  Operations
+    # ---------------------------------------------------------------------------
+
+    def run(self, poll_interval=default_poll_interval, debounce=default_debounce):
+        """
+        Generate every project, then regenerate projects as their files change.
+        The method returns only when interrupted.
+
+        Arguments:
+            poll_interval - the seconds between polls while nothing changes
+            debounce - the seconds a change must be stable before it is used
+        """
+        for filename in self._filenames:
+            self.generate(filename)
+        self._snapshots = self.take_snapshot()
+        print("Watching " + str(len(self._filenames)) + " project config files")
+        while True:
+            time.sleep(poll_interval)
+            snapshot = self.take_snapshot()
+            if snapshot == self._snapshots:
+                continue
+            # Wait until the files stop changing, so a save in several steps is
+            # handled once
+            while True:
+                time.sleep(debounce)
+                settled = self.take_snapshot()
+                if settled == snapshot:
+                    break
+                snapshot = settled
+            changed = [filename for filename in self._filenames
+                       if snapshot.get(filename) != self._snapshots.get(filename)]
+            self._snapshots = snapshot
+            for filename in changed:
+                self.update(filename)
+                # The test suite directory may have moved with the configuration
+                self._snapshots[filename] = self.file_snapshot(filename, snapshot[filename][0])
+        return
+
+    def take_snapshot(self):
+        """Return a dictionary of each watched file name to its file snapshot"""
+        snapshot = {}
+        for filename in self._filenames:
+            snapshot[filename] = self.file_snapshot(filename)
+        return snapshot
+
+    def file_snapshot(self, filename, config_stat=None):
+        """
+        Return the modification time and size of a config file, of the base
+        configurations it extends and, if watched, of its test suite directory.
+
+        Arguments:
+            filename - the project config file
+            config_stat - the modification time and size of the config file if they
+                are already known
+        """
+        if config_stat is None:
+            config_stat = ProjectWatcher.stat(filename)
+        project_config = self._configs.get(filename)
+        if project_config is None:
+            return (config_stat,)
+        bases = ProjectConfig.file_stamps(project_config.dependencies)
+        if self._watch_suites:
+            return config_stat, bases, ProjectWatcher.stat(ProjectWatcher.suite_dir(project_config))
+        return config_stat, bases
+
+    def generate(self, filename):
+        """Check and generate every file of a project, reporting any error.
+
+        Argument:
+            filename - the project config file
+        """
+        print(time.strftime("%H:%M:%S") + " Generating " + filename)
+        self._failed.add(filename)
+        try:
+            project_config = ProjectWatcher.load(filename)
+            # Kept even if generation fails, so its test suite directory is watched
+            self._configs[filename] = project_config
+            main.generate_all(project_config, self._dir_cache, self._io_workers)
+            self._failed.discard(filename)
+        except ProjectConfigException as e:
+            print("Error: " + str(e))
+        return
+
+    def update(self, filename):
+        """Regenerate the files of a project affected by a change.
+
+        Argument:
+            filename - the changed project config file
+        """
+        old = self._configs.get(filename)
+        if old is None or filename in self._failed:
+            self.generate(filename)
+            return
+        try:
+            new = ProjectWatcher.load(filename)
+        except ProjectConfigException as e:
+            # Keep the last good configuration until the file is fixed
+            print(time.strftime("%H:%M:%S") + " Error in " + filename + ": " + str(e))
+            return
+        if len(old.matrix) > 1 or len(new.matrix) > 1 or new.discovery is not None:
+            # Matrix configurations and discovered suites are always generated again
+            self.generate(filename)
+            return
+        changed = ProjectWatcher.changed_fields(old, new)
+        changed.discard("matrix")
+        try:
+            if len(changed) == 0:
+                print(time.strftime("%H:%M:%S") + " Checking test suites of " + filename)
+                self.check_suites(new, new.test_suites)
+            elif changed <= suite_fields | server_fields:
+                print(time.strftime("%H:%M:%S") + " Updating " + ", ".join(sorted(changed)) + " of " + filename)
+                self.update_files(old, new, changed)
+            else:
+                self.generate(filename)
+                return
+            self._configs[filename] = new
+        except ProjectConfigException as e:
+            self._configs[filename] = new
+            self._failed.add(filename)
+            print("Error: " + str(e))
+        return
+
+    def update_files(self, old, new, changed):
+        """
+        Generate the files affected by a change of the test suites or the server.
+
+        Arguments:
+            old - the configuration the files were generated from
+            new - the changed configuration
+            changed - the set of names of the changed fields
+        """
+        old_suites = set(old.test_suites)
+        added = [test_suite for test_suite in new.test_suites if test_suite not in old_suites]
+        self.check_suites(new, added)
+        manifest = OutputManifest.for_project(new, StagedWriter())
+        durations = main.load_durations(new, self._io_workers)
+        properties_creator = PropertyCreator(new, manifest, durations)
+        if "server" in changed:
+            properties_creator.create_properties_files()
+        else:
+            for test_suite in added:
+                properties_creator.create_properties_file(test_suite)
+            keep = set(properties_creator.generate_property_filename(test_suite) for test_suite in new.test_suites)
+            manifest.prune(keep, ".properties")
+        if "test_suites" in changed:
+            bat_creator = BatFileCreator(new, manifest, durations)
+            bat_creator.create_rungfit()
+            bat_creator.create_shards()
+        manifest.save()
+        print("Files written: " + str(manifest.written) + ", skipped: " + str(manifest.skipped) +
+              ", pruned: " + str(manifest.pruned))
+        return
+
+    def check_suites(self, project_config, test_suites):
+        """
+        Check that the directories of test suites exist.
+
+        Arguments:
+            project_config - the parsed project configuration
+            test_suites - the test suites to be checked
+        """
+        main.validate_test_suites(project_config.root,
+                                  project_config.product,
+                                  project_config.test_suite_directory,
+                                  test_suites,
+                                  self._dir_cache)
+        return
+
+    @staticmethod
+    def load(filename):
+        """Return the parsed project configuration with every field read, so that
+        errors in the file are found now.
+
+        Argument:
+            filename - the project config file
+        """
+        project_config = ProjectConfig(filename)
+        project_config.parse()
+        project_config.snapshot()
+        return project_config
+
+    @staticmethod
+    def changed_fields(old, new):
+        """Return the set of names of the fields that differ between two configurations"""
+        old_snapshot = old.snapshot()
+        new_snapshot = new.snapshot()
+        return set(name for name in ProjectConfig.snapshot_fields if old_snapshot[name] != new_snapshot[name])
+
+    @staticmethod
+    def suite_dir(project_config):
+        """Return the directory that holds the test suites of a project"""
+        return project_config.root + "/TESTSUITES/" + project_config.product + "/" + \
+            project_config.test_suite_directory
+
+    @staticmethod
+    def stat(filename):
+        """Return the modification time and size of a file, or None if it is missing"""
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size